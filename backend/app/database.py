@@ -1,30 +1,124 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from app.pool_metrics import (
+    TimedQueuePool,
+    TimedAsyncAdaptedQueuePool,
+    pool_options,
+    instrument_engine
+)
+
 # 优先使用 DATABASE_URL（PostgreSQL），否则回退到 SQLite（本地开发）
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
+# SQLite 生产模式（单机自托管）：连接时启用 WAL 和下列参数，默认关闭
+SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "false").lower() == "true"
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# 负数表示 KiB，-65536 即 64MB 页缓存
+SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"))
+# 写入统一经由单个连接排队执行，避免并发写入时的 database is locked
+SQLITE_SINGLE_WRITER = os.environ.get("SQLITE_SINGLE_WRITER", "true").lower() == "true"
+
+
+def to_async_url(url: str) -> str:
+    """把同步驱动的连接串转换为异步驱动（asyncpg / aiosqlite）"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ("postgres", "postgresql"):
+        query = dict(parsed.query)
+        # asyncpg 不识别 libpq 的 sslmode 参数，对应的参数名为 ssl
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        parsed = parsed.set(drivername="postgresql+asyncpg", query=query)
+    elif backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新连接上设置 SQLite 参数
+
+    WAL 模式下读写互不阻塞，synchronous=NORMAL 时提交只写 WAL 文件、
+    在检查点时才 fsync，断电最多丢失最近的提交但不会损坏数据库。
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    finally:
+        cursor.close()
+
+
 if DATABASE_URL:
-    # PostgreSQL 配置
+    # PostgreSQL 配置，连接池大小等参数见 app/pool_metrics.py
     engine = create_engine(
         DATABASE_URL,
+        poolclass=TimedQueuePool,
+        pool_pre_ping=True,
+        **pool_options()
+    )
+    async_engine = create_async_engine(
+        to_async_url(DATABASE_URL),
+        poolclass=TimedAsyncAdaptedQueuePool,
         pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10
+        **pool_options()
     )
+    # PostgreSQL 支持并发写入，写会话与读会话共用引擎
+    async_write_engine = async_engine
 else:
     # 本地开发使用 SQLite
     DATABASE_PATH = os.environ.get("DATABASE_PATH", "./pal_budget.db")
     SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False},
+        poolclass=TimedQueuePool,
+        **pool_options()
     )
+    # aiosqlite 默认不复用连接（NullPool），这里同样使用队列连接池
+    async_engine = create_async_engine(
+        to_async_url(SQLALCHEMY_DATABASE_URL),
+        poolclass=TimedAsyncAdaptedQueuePool,
+        **pool_options()
+    )
+    # SQLite 同一时刻只允许一个写事务：写会话使用只有一个连接的连接池，
+    # 并发写入在连接池中排队，而不是在数据库锁上轮询等待
+    if SQLITE_SINGLE_WRITER:
+        async_write_engine = create_async_engine(
+            to_async_url(SQLALCHEMY_DATABASE_URL),
+            poolclass=TimedAsyncAdaptedQueuePool,
+            **{**pool_options(), "pool_size": 1, "max_overflow": 0}
+        )
+    else:
+        async_write_engine = async_engine
+
+    if SQLITE_TUNING:
+        for sqlite_engine in {engine, async_engine.sync_engine, async_write_engine.sync_engine}:
+            event.listen(sqlite_engine, "connect", apply_sqlite_pragmas)
+
+instrument_engine("sync", engine)
+instrument_engine("async", async_engine)
+if async_write_engine is not async_engine:
+    instrument_engine("async_writer", async_write_engine)
 
+# 同步会话：建表、迁移、命令行工具和初始化脚本使用
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步会话：API 路由使用，查询期间不阻塞事件循环；
+# 提交后不过期对象，响应序列化时无需再次查询（异步会话不支持隐式懒加载）
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+# 写入数据的接口使用的异步会话（SQLite 下为单一写连接）
+AsyncWriteSessionLocal = async_sessionmaker(async_write_engine, expire_on_commit=False, autoflush=False)
+
 Base = declarative_base()
 
 
@@ -35,3 +129,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_write_db():
+    """获取用于写入的异步数据库会话"""
+    async with AsyncWriteSessionLocal() as db:
+        yield db
@@ -1,13 +1,32 @@
-from fastapi import FastAPI, Request
+import math
+import re
+from contextlib import asynccontextmanager
+from datetime import date
+
+from fastapi import FastAPI, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from app.routers import transactions, statistics, ai, user
-from app.database import engine, Base, SessionLocal
+from app.routers import transactions, statistics, ai, user, internal
+from app.database import async_engine, async_write_engine, SessionLocal, AsyncSessionLocal
 from app.models import User
+from app.migrations import create_tables, run_migrations, auto_migrate_enabled
+from app.services import get_data_version, make_etag, etag_matches
+from app.services.http_client import startup_http_client, shutdown_http_client
+from app.services.image_preprocess import shutdown_pool as shutdown_image_pool
+from app.services.jobs import job_manager
+from app.services.categories import category_cache
 
 # 创建数据库表
-Base.metadata.create_all(bind=engine)
+create_tables()
+
+# 为已有数据库补齐索引等结构
+if auto_migrate_enabled():
+    run_migrations()
 
 
 def init_default_user():
@@ -34,24 +53,85 @@ def init_default_user():
 # 初始化默认用户
 init_default_user()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时加载分类缓存，创建共享 HTTP 连接池、后台任务 worker 和本地模型探活，关闭时依次释放"""
+    async with AsyncSessionLocal() as db:
+        await category_cache.load(db)
+    await startup_http_client()
+    job_manager.start()
+    ai.llm_router.start()
+    yield
+    await ai.llm_router.stop()
+    await ai.parse_batcher.stop()
+    await job_manager.stop()
+    await shutdown_http_client()
+    shutdown_image_pool()
+    await async_engine.dispose()
+    if async_write_engine is not async_engine:
+        await async_write_engine.dispose()
+
+
 app = FastAPI(
     title="可爱记账 API",
     description="一个可爱的记账应用后端服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
-# 禁用缓存中间件
-class NoCacheMiddleware(BaseHTTPMiddleware):
+# 支持条件请求（ETag）的只读接口，响应内容只随用户数据版本变化
+CONDITIONAL_GET_PATTERN = re.compile(
+    r"^/api/(transactions/(\d+)?|statistics/(monthly|category|trend)|user/stats)$"
+)
+
+
+def _set_no_store(response: Response) -> None:
+    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    response.headers["Pragma"] = "no-cache"
+    response.headers["Expires"] = "0"
+
+
+# 缓存控制中间件：列表和统计接口使用 ETag 协商缓存，其余接口禁用缓存
+class CacheControlMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
+        if request.method != "GET" or not CONDITIONAL_GET_PATTERN.match(request.url.path):
+            response = await call_next(request)
+            _set_no_store(response)
+            return response
+
+        # 先读取版本号再执行处理函数：并发写入时最多导致一次多余的 200，不会返回过期的 304
+        async with AsyncSessionLocal() as db:
+            version = await get_data_version(db, 1)
+
+        # 趋势和记账天数依赖当天日期，因此日期也参与计算
+        etag = make_etag(version, request.url.path, request.url.query, date.today())
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=cache_headers)
+
         response = await call_next(request)
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-        response.headers["Pragma"] = "no-cache"
-        response.headers["Expires"] = "0"
+        if response.status_code == 200:
+            response.headers.update(cache_headers)
+        else:
+            _set_no_store(response)
         return response
 
 
-app.add_middleware(NoCacheMiddleware)
+app.add_middleware(CacheControlMiddleware)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """请求体中的 NaN / Infinity 被拒绝后，原样回显会使 JSON 序列化失败，改为字符串"""
+    errors = exc.errors()
+    if not any(isinstance(err.get("input"), float) and not math.isfinite(err["input"]) for err in errors):
+        return await request_validation_exception_handler(request, exc)
+    for err in errors:
+        if isinstance(err.get("input"), float) and not math.isfinite(err["input"]):
+            err["input"] = str(err["input"])
+    return JSONResponse(status_code=422, content={"detail": jsonable_encoder(errors)})
 
 # CORS 配置 - 允许所有来源以支持移动端和云端部署
 app.add_middleware(
@@ -60,6 +140,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # 注册路由
@@ -67,6 +148,7 @@ app.include_router(user.router, prefix="/api/user", tags=["用户"])
 app.include_router(transactions.router, prefix="/api/transactions", tags=["交易"])
 app.include_router(statistics.router, prefix="/api/statistics", tags=["统计"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI服务"])
+app.include_router(internal.router, prefix="/internal", tags=["内部"])
 
 
 @app.get("/")
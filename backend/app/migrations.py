@@ -0,0 +1,321 @@
+"""
+数据库迁移脚本：为已有数据库补齐新增的表结构（可重复执行）
+运行: python -m app.migrations
+
+create_all 只会创建缺失的表，不会给已存在的表补建列和索引，
+因此启动时及手动执行时都会走这里的幂等步骤。
+
+回填新列时旧列保持不变，以便回滚到旧版本；确认不再回滚后执行
+python -m app.migrations --drop-legacy-columns 删除旧列。
+"""
+import os
+import re
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，SQLite 迁移不加文件锁
+    fcntl = None
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import Column, CreateColumn, CreateIndex, Index, Table
+
+from app.database import engine, Base
+from app.models import Category, DailyRollup, Transaction
+from app.money import to_cents
+from app.services.rollup import rebuild_rollup
+
+
+def _is_postgres(bind: Engine) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def _add_column(bind: Engine, table: Table, column: Column) -> None:
+    preparer = bind.dialect.identifier_preparer
+    column_ddl = CreateColumn(column).compile(dialect=bind.dialect)
+    ddl = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}"
+    with bind.begin() as conn:
+        conn.execute(text(ddl))
+
+
+def ensure_columns(bind: Engine = engine) -> None:
+    """为已存在的表补建新增的列
+
+    新增列须可为空或带有 server_default，两种数据库上都只修改表定义，不重写数据。
+    """
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=table.schema):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name, schema=table.schema)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            print(f"Adding column {column.name} to {table.name}")
+            _add_column(bind, table, column)
+
+
+def upgrade_rollup_table(bind: Engine = engine) -> None:
+    """汇总表结构变化（金额改为整数分、分类改为 category_id）时，
+    旧表可由交易表重建，直接删除后重新创建"""
+    table = DailyRollup.__table__
+    inspector = inspect(bind)
+    if not inspector.has_table(table.name, schema=table.schema):
+        return
+    existing = {c["name"] for c in inspector.get_columns(table.name, schema=table.schema)}
+    if {c.name for c in table.columns} <= existing:
+        return
+    print(f"Recreating {table.name} with the current schema (will be rebuilt from transactions)")
+    table.drop(bind)
+    table.create(bind)
+
+
+# 回填金额、分类时每批更新的行数，避免长时间持有写锁
+BACKFILL_BATCH = 10000
+
+
+def backfill_amount_cents(bind: Engine = engine) -> int:
+    """把旧库中浮点 amount 列的值换算为分写入 amount_cents（按主键分批，可重复执行）
+
+    换算在 Python 中用 to_cents 完成，与应用写入时的舍入一致（1.005 -> 101）；
+    SQL 的 ROUND(amount * 100) 作用在二进制浮点数上，会得到 100。
+    旧列保持不变，回滚到旧版本时数据仍然可用，确认升级后再用 drop_legacy_columns 删除。
+    """
+    table = Transaction.__table__
+    inspector = inspect(bind)
+    columns = {c["name"] for c in inspector.get_columns(table.name, schema=table.schema)}
+    if "amount" not in columns:
+        return 0
+
+    table_name = bind.dialect.identifier_preparer.format_table(table)
+    with bind.connect() as conn:
+        max_id = conn.execute(text(f"SELECT MAX(id) FROM {table_name}")).scalar() or 0
+
+    updated = 0
+    for start in range(0, max_id, BACKFILL_BATCH):
+        with bind.begin() as conn:
+            # 只处理尚未换算的行：新版本写入的行 amount_cents 总有值
+            rows = conn.execute(text(
+                f"SELECT id, amount FROM {table_name} "
+                f"WHERE id > :start AND id <= :end AND amount_cents IS NULL"
+            ), {"start": start, "end": start + BACKFILL_BATCH}).all()
+            if not rows:
+                continue
+            conn.execute(
+                text(f"UPDATE {table_name} SET amount_cents = :cents WHERE id = :id"),
+                [{"id": row_id, "cents": to_cents(float(amount or 0))} for row_id, amount in rows]
+            )
+            updated += len(rows)
+    if updated:
+        print(f"Backfilled amount_cents: {updated} rows")
+    return updated
+
+
+def backfill_category_ids(bind: Engine = engine) -> int:
+    """把旧库中的 category 文本去重写入 categories 表，并回填 transactions.category_id
+
+    名称去除首尾空白后去重，分类类型取该名称出现过的任一交易类型；按主键分批，可重复执行。
+    旧列保持不变，只回填 category_id 为空的行（含回滚到旧版本期间写入的行）。
+    """
+    table = Transaction.__table__
+    inspector = inspect(bind)
+    columns = {c["name"] for c in inspector.get_columns(table.name, schema=table.schema)}
+    if "category" not in columns:
+        return 0
+
+    preparer = bind.dialect.identifier_preparer
+    transactions = preparer.format_table(table)
+    categories = preparer.format_table(Category.__table__)
+
+    with bind.begin() as conn:
+        result = conn.execute(text(
+            f"INSERT INTO {categories} (name, type) "
+            f"SELECT TRIM(t.category), MIN(t.type) FROM {transactions} t "
+            f"WHERE t.category_id IS NULL AND t.category IS NOT NULL AND TRIM(t.category) <> '' "
+            f"AND NOT EXISTS (SELECT 1 FROM {categories} c WHERE c.name = TRIM(t.category)) "
+            f"GROUP BY TRIM(t.category)"
+        ))
+        if result.rowcount:
+            print(f"Created {result.rowcount} categories from transaction names")
+        max_id = conn.execute(text(f"SELECT MAX(id) FROM {transactions}")).scalar() or 0
+
+    updated = 0
+    for start in range(0, max_id, BACKFILL_BATCH):
+        with bind.begin() as conn:
+            # 空名称的交易保持未分类
+            result = conn.execute(text(
+                f"UPDATE {transactions} SET category_id = ("
+                f"SELECT c.id FROM {categories} c WHERE c.name = TRIM({transactions}.category)"
+                f") "
+                f"WHERE id > :start AND id <= :end AND category_id IS NULL "
+                f"AND category IS NOT NULL AND TRIM(category) <> ''"
+            ), {"start": start, "end": start + BACKFILL_BATCH})
+            updated += result.rowcount or 0
+    if updated:
+        print(f"Backfilled category_id: {updated} rows")
+    return updated
+
+
+# 多个 worker / 实例同时启动时串行执行迁移的 PostgreSQL 会话级咨询锁
+MIGRATION_LOCK_ID = 7210250002
+
+
+def _drop_invalid_indexes(bind: Engine) -> None:
+    """清理 PostgreSQL 上 CONCURRENTLY 建索引中断后遗留的无效索引
+
+    只处理本模块按模型创建的索引（同名、同 schema），不影响共享数据库中其他应用的索引；
+    调用方持有迁移锁，其他 worker 不会同时在建索引，此时的无效索引都是中断遗留的。
+    """
+    for table in Base.metadata.sorted_tables:
+        names = [index.name for index in table.indexes]
+        if not names:
+            continue
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            rows = conn.execute(text(
+                "SELECT n.nspname, c.relname FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE NOT i.indisvalid "
+                "AND n.nspname = COALESCE(:schema, current_schema()) "
+                "AND c.relname = ANY(:names)"
+            ), {"schema": table.schema, "names": names}).all()
+            for schema, name in rows:
+                print(f"Dropping invalid index {schema}.{name}")
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{name}"'))
+
+
+def _create_index(bind: Engine, index: Index) -> None:
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=bind.dialect))
+
+    if _is_postgres(bind):
+        # CONCURRENTLY 不阻塞读写，但不能在事务块中执行
+        ddl = re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", ddl)
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(ddl))
+    else:
+        # SQLite 建索引期间只阻塞写入，读不受影响
+        with bind.begin() as conn:
+            conn.execute(text(ddl))
+
+
+def _create_missing_indexes(bind: Engine) -> None:
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=table.schema):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name, schema=table.schema)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            print(f"Creating index {index.name} on {table.name}")
+            _create_index(bind, index)
+
+
+def ensure_indexes(bind: Engine = engine) -> None:
+    """为已存在的表补建模型中声明但数据库中缺失的索引（须在 migration_lock 内调用）"""
+    if _is_postgres(bind):
+        _drop_invalid_indexes(bind)
+    _create_missing_indexes(bind)
+
+
+def backfill_rollup(bind: Engine = engine, force: bool = False) -> None:
+    """汇总表为空而已有交易时（新增汇总表后首次启动），从交易表回填
+
+    force=True 时无论是否为空都重建（本次启动回填了旧版本写入的行，汇总表中没有它们）
+    """
+    with Session(bind) as db:
+        if not force and db.query(DailyRollup.user_id).first() is not None:
+            return
+        if db.query(Transaction.id).first() is None:
+            return
+        rows = rebuild_rollup(db)
+        db.commit()
+        print(f"Backfilled daily_rollup: {rows} rows")
+
+
+# 旧版本使用、已回填到新列的列：{表: [列名]}，只在确认不再回滚后手动删除
+LEGACY_COLUMNS = {
+    Transaction.__table__: ["amount", "category"],
+}
+
+
+def drop_legacy_columns(bind: Engine = engine) -> None:
+    """删除已回填的旧列（不可回滚到旧版本）；运行: python -m app.migrations --drop-legacy-columns
+
+    先执行一遍回填，保证删除前所有行都已换算。
+    """
+    backfill_amount_cents(bind)
+    backfill_category_ids(bind)
+    preparer = bind.dialect.identifier_preparer
+    inspector = inspect(bind)
+    for table, names in LEGACY_COLUMNS.items():
+        existing = {c["name"] for c in inspector.get_columns(table.name, schema=table.schema)}
+        for name in names:
+            if name not in existing:
+                continue
+            print(f"Dropping legacy column {name} from {table.name}")
+            with bind.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} DROP COLUMN {preparer.quote(name)}"))
+
+
+@contextmanager
+def migration_lock(bind: Engine = engine):
+    """跨进程串行执行迁移：多个 worker 同时启动时，补列、重建汇总表、回填不会互相冲突
+
+    PostgreSQL 使用会话级咨询锁，持锁连接为自动提交，不保留打开的事务
+    （CONCURRENTLY 建索引会等待所有旧事务结束）；SQLite 对数据库旁的锁文件加 flock。
+    """
+    if _is_postgres(bind):
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            try:
+                yield
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+        return
+
+    database = bind.url.database
+    if fcntl is None or not database or database == ":memory:":
+        yield
+        return
+    with open(f"{database}.migrate.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def create_tables(bind: Engine = engine) -> None:
+    """在迁移锁内创建缺失的表，多个 worker 同时建表时不会报表已存在"""
+    with migration_lock(bind):
+        Base.metadata.create_all(bind=bind)
+
+
+def run_migrations(bind: Engine = engine) -> None:
+    """在迁移锁内执行全部迁移步骤；后启动的 worker 等待锁释放后各步骤均为空操作"""
+    with migration_lock(bind):
+        upgrade_rollup_table(bind)
+        ensure_columns(bind)
+        backfilled = backfill_amount_cents(bind)
+        backfilled += backfill_category_ids(bind)
+        ensure_indexes(bind)
+        backfill_rollup(bind, force=backfilled > 0)
+
+
+def auto_migrate_enabled() -> bool:
+    """启动时是否自动迁移，大表可设置 AUTO_MIGRATE=false 后手动执行"""
+    return os.environ.get("AUTO_MIGRATE", "true").lower() == "true"
+
+
+if __name__ == "__main__":
+    import sys
+
+    create_tables()
+    run_migrations()
+    if "--drop-legacy-columns" in sys.argv[1:]:
+        with migration_lock():
+            drop_legacy_columns()
+    print("[DONE] Migrations applied")
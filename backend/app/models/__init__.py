@@ -1,3 +1,3 @@
-from .models import User, Category, Transaction, TransactionType, TransactionSource
+from .models import User, Category, Transaction, DailyRollup, TransactionType, TransactionSource
 
-__all__ = ["User", "Category", "Transaction", "TransactionType", "TransactionSource"]
+__all__ = ["User", "Category", "Transaction", "DailyRollup", "TransactionType", "TransactionSource"]
@@ -1,10 +1,12 @@
 import os
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
 
 from app.database import Base
+from app.money import to_cents, from_cents
 
 # PostgreSQL 时使用 myschema，SQLite 不需要 schema
 SCHEMA = "myschema" if os.environ.get("DATABASE_URL") else None
@@ -31,6 +33,8 @@ class User(Base):
     nickname = Column(String(50), default="记账小达人")
     avatar_url = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # 交易数据版本号，每次写入交易时递增，用作 ETag 校验值
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     transactions = relationship("Transaction", back_populates="user")
 
@@ -48,16 +52,63 @@ class Category(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
-    __table_args__ = {"schema": SCHEMA} if SCHEMA else {}
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey(f"{SCHEMA}.users.id" if SCHEMA else "users.id"))
     type = Column(Enum(TransactionType))
-    amount = Column(Float)
-    category = Column(String(50))
+    # 金额以分为单位存储；旧库中的浮点 amount 列由 app/migrations.py 回填到此列后不再使用。
+    # 不设 server_default：旧库补列后为 NULL，回填按 NULL 判断哪些行尚未换算（含回滚到旧版本期间写入的行）
+    amount_cents = Column(BigInteger, nullable=True, default=0)
+    # 引用分类维度表；旧库中的 category 文本列由 app/migrations.py 去重回填到此列后不再使用
+    category_id = Column(Integer, ForeignKey(f"{SCHEMA}.categories.id" if SCHEMA else "categories.id"), nullable=True)
     description = Column(String(255), nullable=True)
     date = Column(Date)
     source = Column(Enum(TransactionSource), default=TransactionSource.manual)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="transactions")
+
+    @hybrid_property
+    def amount(self):
+        """以元为单位的金额（Decimal），赋值时按分四舍五入"""
+        return from_cents(self.amount_cents)
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_cents = to_cents(value)
+
+    @amount.expression
+    def amount(cls):
+        return cls.amount_cents / 100.0
+
+    @property
+    def category(self) -> str:
+        """分类名称（由内存中的分类缓存解析）；写入时先用 category_cache.resolve_id 换成 id"""
+        # 延迟导入，避免 app.services 与模型之间的循环导入
+        from app.services.categories import category_cache
+        return category_cache.name(self.category_id)
+
+    # 覆盖 user_id + 日期范围 (+ type) 的统计查询，以及列表接口的 date desc, id desc 排序
+    # 已有数据库上的索引由 app/migrations.py 补建
+    __table_args__ = (
+        Index("ix_transactions_user_date_type", user_id, date, type),
+        Index("ix_transactions_user_date_id", user_id, date.desc(), id.desc()),
+    ) + (({"schema": SCHEMA},) if SCHEMA else ())
+
+
+class DailyRollup(Base):
+    """按 (用户, 日期, 类型, 分类) 预聚合的交易汇总
+
+    由交易的增删改接口在同一个数据库事务内维护，统计接口直接读取此表，
+    可用 python rollup.py rebuild 全量重建。
+    """
+    __tablename__ = "daily_rollup"
+    __table_args__ = {"schema": SCHEMA} if SCHEMA else {}
+
+    user_id = Column(Integer, primary_key=True)
+    date = Column(Date, primary_key=True)
+    type = Column(Enum(TransactionType), primary_key=True)
+    # 未分类的交易记为 0
+    category_id = Column(Integer, primary_key=True)
+    amount_cents = Column(BigInteger, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,51 @@
+"""
+金额的整数分存储
+
+数据库以 BIGINT 保存金额的最小单位（分），聚合在数据库中按整数精确求和；
+对外接口仍使用元为单位的数值，应用内部以 Decimal 表示。
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Optional, Union
+
+CENT = Decimal("0.01")
+
+# 单笔金额上限（元），接口校验使用；换算为分后远小于 BIGINT 上限
+MAX_AMOUNT = 1_000_000_000_000
+# BIGINT 能表示的最大分值
+MAX_CENTS = 2 ** 63 - 1
+
+Amount = Union[int, float, str, Decimal]
+
+
+def to_cents(value: Optional[Amount]) -> int:
+    """元 -> 分，四舍五入到分；浮点数按其十进制表示转换（0.29 -> 29，而非 28）
+
+    NaN、无穷大、超出 BIGINT 范围等无法换算的值抛出 ValueError
+    """
+    if value is None:
+        return 0
+    if isinstance(value, float):
+        value = repr(value)
+    try:
+        amount = Decimal(value)
+        if not amount.is_finite():
+            raise ValueError(f"invalid amount: {value}")
+        cents = int(amount.quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+    except InvalidOperation:
+        # quantize 的结果超出 Decimal 精度（如 1e300）
+        raise ValueError(f"amount out of range: {value}")
+    if abs(cents) > MAX_CENTS:
+        raise ValueError(f"amount out of range: {value}")
+    return cents
+
+
+def from_cents(cents: Optional[int]) -> Decimal:
+    """分 -> 元（两位小数的 Decimal）"""
+    return Decimal(int(cents or 0)).scaleb(-2)
+
+
+def percentage(part: int, total: int) -> Decimal:
+    """part 占 total 的百分比，保留一位小数"""
+    if not total:
+        return Decimal("0")
+    return (Decimal(part) * 100 / Decimal(total)).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
@@ -0,0 +1,171 @@
+"""
+数据库连接池的配置与观测
+
+连接池参数由环境变量控制，同步和异步引擎使用相同的配置：
+
+    DB_POOL_SIZE      常驻连接数（默认 5）
+    DB_MAX_OVERFLOW   高峰期额外创建的连接数（默认 10）
+    DB_POOL_TIMEOUT   连接耗尽时等待空闲连接的秒数，超时抛出 TimeoutError（默认 30）
+    DB_POOL_RECYCLE   连接存活超过该秒数后重建，-1 为不限（默认 -1）
+    DB_POOL_LIFO      优先复用最近归还的连接，便于空闲连接自然超时（默认 false）
+
+PoolMetrics 通过连接池事件统计借出/归还、连接创建/关闭（连接抖动）和失效次数，
+并记录借出连接时的等待时间。等待时间长而查询耗时正常说明连接池不足，
+反之说明是查询本身慢。
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_LIFO = os.getenv("DB_POOL_LIFO", "false").lower() == "true"
+
+# 计算等待时间分位数时保留的最近样本数
+WAIT_SAMPLES = 1000
+
+
+def pool_options() -> dict:
+    """create_engine / create_async_engine 的连接池参数"""
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_use_lifo": DB_POOL_LIFO,
+    }
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._pool: Optional[QueuePool] = None
+
+    def observe_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._waits.append(seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def _incr(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def attach(self, pool: QueuePool) -> None:
+        """在连接池上注册事件监听（引擎 dispose 重建连接池时监听随之保留）"""
+        self._pool = pool
+        pool._pool_metrics = self
+        event.listen(pool, "connect", lambda *args: self._incr("connects"))
+        event.listen(pool, "close", lambda *args: self._incr("closes"))
+        event.listen(pool, "close_detached", lambda *args: self._incr("closes"))
+        event.listen(pool, "invalidate", lambda *args: self._incr("invalidations"))
+        event.listen(pool, "checkout", lambda *args: self._incr("checkouts"))
+        event.listen(pool, "checkin", lambda *args: self._incr("checkins"))
+
+    def stats(self) -> dict:
+        pool = self._pool
+        with self._lock:
+            waits = sorted(self._waits)
+            uptime = time.monotonic() - self._started
+            result = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "closes": self.closes,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                # 每分钟新建的连接数，持续偏高说明连接被频繁回收或失效
+                "connects_per_min": round(self.connects / uptime * 60, 2) if uptime else 0.0,
+                "wait_ms": {
+                    "avg": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else 0.0,
+                    "p50": round(_percentile(waits, 0.5) * 1000, 3),
+                    "p95": round(_percentile(waits, 0.95) * 1000, 3),
+                    "max": round(self.wait_max * 1000, 3)
+                }
+            }
+        if isinstance(pool, QueuePool):
+            result.update({
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                # QueuePool 在常驻连接未用满时 overflow 为负数
+                "overflow": max(0, pool.overflow()),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+                "recycle": pool._recycle
+            })
+        return result
+
+
+def _percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class _TimedCheckoutMixin:
+    """记录从连接池取出连接的等待时间（包括新建连接的耗时）"""
+
+    def _do_get(self):
+        metrics: Optional[PoolMetrics] = getattr(self, "_pool_metrics", None)
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if metrics:
+                metrics.observe_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if metrics:
+            metrics.observe_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        metrics = getattr(self, "_pool_metrics", None)
+        if metrics:
+            metrics._pool = pool
+            pool._pool_metrics = metrics
+        return pool
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# 按名称登记的连接池观测，供内部指标接口读取
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def instrument_engine(name: str, engine) -> PoolMetrics:
+    """为引擎（同步引擎，或异步引擎的 sync_engine）的连接池挂上观测"""
+    metrics = PoolMetrics(name)
+    metrics.attach(engine.pool)
+    pool_metrics[name] = metrics
+    return metrics
@@ -2,5 +2,6 @@ from .transactions import router as transactions_router
 from .statistics import router as statistics_router
 from .user import router as user_router
 from .ai import router as ai_router
+from .internal import router as internal_router
 
-__all__ = ["transactions_router", "statistics_router", "user_router", "ai_router"]
+__all__ = ["transactions_router", "statistics_router", "user_router", "ai_router", "internal_router"]
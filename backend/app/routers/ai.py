@@ -1,13 +1,34 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Optional, List
+from datetime import date
+import asyncio
 import re
 import os
-import requests
-import asyncio
 import base64
 import json
-from concurrent.futures import ThreadPoolExecutor
+
+from app.services.voice_cache import voice_cache, get_cached_parse, store_parse
+from app.services.keywords import keyword_classifier, reload_keywords
+from app.services.image_preprocess import preprocess_receipt_image
+from app.services.receipt_cache import receipt_cache, content_hash, compute_perceptual_hash
+from app.services.rate_limit import TokenBucket
+from app.services.batcher import MicroBatcher
+from app.services.jobs import job_manager, check_callback_url, QueueFullError, LANE_VOICE, LANE_VISION
+from app.services.resilience import AI_VOICE_DEADLINE, AI_CHAT_DEADLINE, AI_VISION_DEADLINE
+from app.services.llm_backends import (
+    create_llm_router,
+    USE_OLLAMA,
+    TASK_PARSE,
+    TASK_CHAT,
+    TASK_VISION
+)
+from app.services import bulk_insert_transactions, invalidate_dates
+from app.database import get_async_db, AsyncWriteSessionLocal
+from app.services.finance_summary import FinanceSummary, get_finance_summary, format_finance_summary
+from app.schemas import TransactionCreate
 
 router = APIRouter()
 
@@ -17,10 +38,22 @@ AI_API_KEY = os.getenv("AI_API_KEY", "")
 AI_API_BASE = os.getenv("AI_API_BASE", "https://api.siliconflow.cn/v1")
 AI_MODEL = os.getenv("AI_MODEL", "Qwen/Qwen2.5-7B-Instruct")
 AI_VISION_MODEL = os.getenv("AI_VISION_MODEL", "Qwen/Qwen3-VL-32B-Instruct")  # 更大的32B视觉模型
-USE_OLLAMA = os.getenv("USE_OLLAMA", "false").lower() == "true"
 
-# 线程池用于同步请求
-executor = ThreadPoolExecutor(max_workers=4)
+# 云端与本地（USE_OLLAMA / LOCAL_LLM_BACKEND）模型的路由，由应用 lifespan 启动本地探活
+llm_router = create_llm_router(AI_API_KEY, AI_API_BASE, AI_MODEL, AI_VISION_MODEL)
+
+# 语音解析微批处理（默认关闭）：在窗口期内合并并发请求，最多 AI_BATCH_MAX 条一批
+AI_PARSE_BATCHING = os.getenv("AI_PARSE_BATCHING", "false").lower() == "true"
+AI_BATCH_WINDOW_MS = float(os.getenv("AI_BATCH_WINDOW_MS", "20"))
+AI_BATCH_MAX = int(os.getenv("AI_BATCH_MAX", "8"))
+
+# 批量扫描的并发上限、单次图片数上限，以及视觉模型调用频率（次/秒，0 为不限）
+AI_SCAN_CONCURRENCY = int(os.getenv("AI_SCAN_CONCURRENCY", "4"))
+AI_SCAN_MAX_FILES = int(os.getenv("AI_SCAN_MAX_FILES", "50"))
+AI_SCAN_RATE = float(os.getenv("AI_SCAN_RATE", "2"))
+
+scan_semaphore = asyncio.Semaphore(max(1, AI_SCAN_CONCURRENCY))
+scan_rate_limiter = TokenBucket(AI_SCAN_RATE, capacity=AI_SCAN_CONCURRENCY)
 
 
 class VoiceParseRequest(BaseModel):
@@ -34,6 +67,11 @@ class VoiceParseResponse(BaseModel):
     description: Optional[str] = None
 
 
+class VoiceParseJobRequest(BaseModel):
+    text: str
+    callback_url: Optional[str] = None
+
+
 class AIQueryRequest(BaseModel):
     query: str
     history: Optional[List[dict]] = None
@@ -45,73 +83,37 @@ class AIConfigRequest(BaseModel):
     model: Optional[str] = None
 
 
-def sync_ai_request(url: str, headers: dict, json_data: dict, timeout: int = 60) -> Optional[dict]:
-    """同步 AI 请求 - 禁用代理以避免连接问题"""
-    try:
-        # 禁用代理，直接连接
-        response = requests.post(
-            url,
-            headers=headers,
-            json=json_data,
-            timeout=timeout,
-            proxies={"http": None, "https": None}
-        )
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"AI API error: {response.status_code} - {response.text[:500]}")
-    except Exception as e:
-        print(f"AI API error: {type(e).__name__}: {e}")
-    return None
-
-
 @router.post("/parse-voice", response_model=VoiceParseResponse)
 async def parse_voice_text(request: VoiceParseRequest):
     """解析语音文本，提取金额、类别等信息"""
     text = request.text
 
-    # 如果配置了 AI API，使用 AI 解析
-    if AI_API_KEY or USE_OLLAMA:
+    # 如果配置了 AI API 或本地模型可用，使用 AI 解析
+    if llm_router.enabled(TASK_PARSE):
+        # 相同句式（仅金额不同）直接复用缓存的分类结果
+        cached = get_cached_parse(text)
+        if cached:
+            return VoiceParseResponse(**cached)
+
         try:
             result = await ai_parse_transaction(text)
             if result:
-                return VoiceParseResponse(**result)
+                response = VoiceParseResponse(**result)
+                store_parse(text, response.model_dump())
+                return response
         except Exception as e:
             print(f"AI parse error: {e}")
 
     # 回退到规则解析
     amount = 0.0
-    category = "其他"
-    transaction_type = "expense"
 
     # 提取金额
     amount_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:元|块|¥)?', text)
     if amount_match:
         amount = float(amount_match.group(1))
 
-    # 判断收入还是支出
-    if any(word in text for word in ['收入', '工资', '奖金', '收到', '进账']):
-        transaction_type = "income"
-        category = "工资"
-    else:
-        transaction_type = "expense"
-
-    # 判断类别
-    category_keywords = {
-        '餐饮': ['吃', '餐', '饭', '午餐', '晚餐', '早餐', '外卖', '饮料', '咖啡', '奶茶'],
-        '交通': ['车', '打车', '地铁', '公交', '油费', '停车', '高铁', '机票', '滴滴'],
-        '购物': ['买', '购物', '超市', '淘宝', '京东', '商场', '衣服'],
-        '娱乐': ['电影', '游戏', '唱歌', 'KTV', '旅游', '玩'],
-        '住房': ['房租', '水电', '物业', '燃气'],
-        '医疗': ['医院', '药', '看病', '体检'],
-        '教育': ['书', '课程', '学费', '培训'],
-        '通讯': ['话费', '网费', '流量'],
-    }
-
-    for cat, keywords in category_keywords.items():
-        if any(kw in text for kw in keywords):
-            category = cat
-            break
+    # 一次扫描完成收入判断和分类计分
+    transaction_type, category = keyword_classifier.classify(text)
 
     return VoiceParseResponse(
         type=transaction_type,
@@ -121,42 +123,36 @@ async def parse_voice_text(request: VoiceParseRequest):
     )
 
 
+VOICE_CATEGORY_OPTIONS = """分类选项：
+- 支出：餐饮、交通、购物、娱乐、住房、医疗、教育、通讯、其他
+- 收入：工资、奖金、兼职、投资、其他"""
+
+
 async def ai_parse_transaction(text: str) -> Optional[dict]:
-    """使用 AI 解析交易信息"""
+    """使用 AI 解析交易信息；开启 AI_PARSE_BATCHING 时与同时到达的请求合并为一次调用"""
+    if AI_PARSE_BATCHING:
+        return await parse_batcher.submit(text)
+    return await _ai_parse_single(text)
+
+
+async def _ai_parse_single(text: str) -> Optional[dict]:
     prompt = f"""请从以下文本中提取记账信息，返回 JSON 格式：
 文本："{text}"
 
 请返回以下格式的 JSON（不要其他内容）：
 {{"type": "expense 或 income", "amount": 数字, "category": "分类名称", "description": "备注"}}
 
-分类选项：
-- 支出：餐饮、交通、购物、娱乐、住房、医疗、教育、通讯、其他
-- 收入：工资、奖金、兼职、投资、其他"""
+{VOICE_CATEGORY_OPTIONS}"""
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {AI_API_KEY}"
-    }
-    json_data = {
-        "model": AI_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.3
-    }
-
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(
-        executor,
-        sync_ai_request,
-        f"{AI_API_BASE}/chat/completions",
-        headers,
-        json_data,
-        30
+    content = await llm_router.complete(
+        TASK_PARSE,
+        [{"role": "user", "content": prompt}],
+        temperature=0.3,
+        deadline=AI_VOICE_DEADLINE
     )
 
-    if result:
+    if content:
         try:
-            content = result["choices"][0]["message"]["content"]
-            import json
             json_match = re.search(r'\{.*\}', content, re.DOTALL)
             if json_match:
                 return json.loads(json_match.group())
@@ -165,38 +161,57 @@ async def ai_parse_transaction(text: str) -> Optional[dict]:
     return None
 
 
-@router.post("/scan-receipt")
-async def scan_receipt(file: UploadFile = File(...)):
-    """扫描小票/发票，使用 AI 视觉识别金额和商家"""
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="请上传图片文件")
+def _is_valid_parse(entry) -> bool:
+    return isinstance(entry, dict) and "type" in entry and "amount" in entry
 
-    # 读取图片并转为 base64
-    try:
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode('utf-8')
 
-        # 根据文件类型确定 MIME 类型
-        mime_type = file.content_type or "image/jpeg"
+async def ai_parse_transactions_batch(texts: List[str]) -> List[Optional[dict]]:
+    """用一次调用解析多条文本，返回与 texts 等长的结果列表
 
+    整批请求失败时全部返回 None（交给规则解析）；响应中缺失或无效的条目单独重新解析。
+    """
+    if len(texts) == 1:
+        return [await _ai_parse_single(texts[0])]
+
+    numbered = "\n".join(f'{i}. "{text}"' for i, text in enumerate(texts, 1))
+    prompt = f"""请从以下 {len(texts)} 条文本中分别提取记账信息：
+{numbered}
+
+请返回 JSON 数组（不要其他内容），按编号顺序每条文本对应一个对象：
+[{{"index": 1, "type": "expense 或 income", "amount": 数字, "category": "分类名称", "description": "备注"}}]
+
+{VOICE_CATEGORY_OPTIONS}"""
+
+    content = await llm_router.complete(
+        TASK_PARSE,
+        [{"role": "user", "content": prompt}],
+        temperature=0.3,
+        deadline=AI_VOICE_DEADLINE
+    )
+    if not content:
+        return [None] * len(texts)
+
+    parsed = {}
+    try:
+        json_match = re.search(r'\[.*\]', content, re.DOTALL)
+        entries = json.loads(json_match.group()) if json_match else []
+        for position, entry in enumerate(entries, 1):
+            if isinstance(entry, dict):
+                parsed[int(entry.pop("index", position))] = entry
     except Exception as e:
-        print(f"Error reading image: {e}")
-        raise HTTPException(status_code=400, detail="无法读取图片文件")
+        print(f"Batch parse error: {e}")
 
-    # 如果配置了 AI API，使用视觉模型识别
-    if AI_API_KEY:
-        try:
-            result = await ai_vision_parse_receipt(base64_image, mime_type)
-            if result:
-                return {
-                    "success": True,
-                    "data": result,
-                    "message": "AI 识别成功"
-                }
-        except Exception as e:
-            print(f"AI vision error: {e}")
+    missing = [i for i in range(1, len(texts) + 1) if not _is_valid_parse(parsed.get(i))]
+    if missing:
+        retried = await asyncio.gather(*(_ai_parse_single(texts[i - 1]) for i in missing))
+        parsed.update(zip(missing, retried))
+    return [parsed.get(i) for i in range(1, len(texts) + 1)]
 
-    # 回退到空结果
+
+parse_batcher = MicroBatcher(ai_parse_transactions_batch, AI_BATCH_WINDOW_MS, AI_BATCH_MAX)
+
+
+def _empty_scan_result() -> dict:
     return {
         "success": True,
         "data": {
@@ -210,6 +225,194 @@ async def scan_receipt(file: UploadFile = File(...)):
     }
 
 
+async def _scan_image(image_data: bytes, mime_type: str) -> dict:
+    """识别一张图片，返回与 /scan-receipt 相同结构的结果"""
+    # 如果配置了 AI API 或本地视觉模型，使用视觉模型识别
+    if llm_router.enabled(TASK_VISION):
+        # 同一张图片重复上传时直接返回缓存结果
+        sha = content_hash(image_data)
+        cached = receipt_cache.get(sha)
+        if cached is not None:
+            return {
+                "success": True,
+                "data": cached,
+                "message": "AI 识别成功"
+            }
+
+        # 旋正、缩放并重新压缩后再转为 base64
+        image_data, mime_type = await preprocess_receipt_image(image_data, mime_type)
+        phash = await compute_perceptual_hash(image_data)
+        cached = receipt_cache.get_similar(phash)
+        if cached is not None:
+            # 近似匹配的结果来自另一张相似图片，不写入本图的精确缓存，由用户确认
+            return {
+                "success": True,
+                "data": cached,
+                "approximate": True,
+                "message": "识别结果来自相似图片，请核对"
+            }
+
+        base64_image = base64.b64encode(image_data).decode('utf-8')
+        try:
+            await scan_rate_limiter.acquire()
+            result = await ai_vision_parse_receipt(base64_image, mime_type)
+            if result:
+                await receipt_cache.put(sha, result, phash)
+                return {
+                    "success": True,
+                    "data": result,
+                    "message": "AI 识别成功"
+                }
+        except Exception as e:
+            print(f"AI vision error: {e}")
+
+    # 回退到空结果
+    return _empty_scan_result()
+
+
+@router.post("/scan-receipt")
+async def scan_receipt(file: UploadFile = File(...)):
+    """扫描小票/发票，使用 AI 视觉识别金额和商家"""
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="请上传图片文件")
+
+    # 读取图片
+    try:
+        image_data = await file.read()
+
+        # 根据文件类型确定 MIME 类型
+        mime_type = file.content_type or "image/jpeg"
+
+    except Exception as e:
+        print(f"Error reading image: {e}")
+        raise HTTPException(status_code=400, detail="无法读取图片文件")
+
+    return await _scan_image(image_data, mime_type)
+
+
+def _scan_to_transaction(data: dict) -> Optional[dict]:
+    """把识别结果转换为待写入的交易，未识别出金额（含回退的空结果）时返回 None
+
+    金额超出范围等不符合交易校验的结果抛出 ValidationError
+    """
+    if not isinstance(data, dict):
+        return None
+    try:
+        amount = float(data.get("amount") or 0)
+    except (TypeError, ValueError):
+        return None
+    if amount <= 0:
+        return None
+
+    try:
+        day = date.fromisoformat(str(data.get("date") or "")[:10])
+    except ValueError:
+        day = date.today()
+
+    return TransactionCreate(
+        type="expense",
+        amount=amount,
+        category=data.get("category") or "其他",
+        description=data.get("merchant") or "扫描录入",
+        date=day,
+        source="photo"
+    ).model_dump()
+
+
+async def _create_scanned_transactions(rows: List[dict]) -> int:
+    """批量写入识别出的交易；在流式响应中执行，因此自行管理会话"""
+    async with AsyncWriteSessionLocal() as db:
+        try:
+            result = await bulk_insert_transactions(db, user_id=1, rows=rows)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    invalidate_dates(1, result.month_dates.values())
+    return result.inserted
+
+
+@router.post("/scan-receipts")
+async def scan_receipts(
+    files: List[UploadFile] = File(...),
+    create: bool = Form(False)
+):
+    """批量扫描小票，按完成顺序逐行返回 NDJSON
+
+    每张图片一行 {index, filename, success, data, message}，最后一行为
+    {done, total, succeeded, created}，succeeded 只统计识别出有效金额的图片。
+    create=true 时把识别出金额的结果（近似匹配的除外）一次性批量写入交易记录。
+    """
+    if len(files) > AI_SCAN_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"一次最多上传 {AI_SCAN_MAX_FILES} 张图片")
+
+    # 响应开始流式输出后上传文件即被关闭，先读取全部内容
+    uploads = []
+    for file in files:
+        mime_type = file.content_type or ""
+        data = await file.read() if mime_type.startswith('image/') else None
+        uploads.append((file.filename, data, mime_type))
+
+    async def scan_one(index: int, filename: str, data: Optional[bytes], mime_type: str) -> dict:
+        if data is None:
+            return {"index": index, "filename": filename, "success": False, "data": None, "message": "请上传图片文件"}
+        async with scan_semaphore:
+            try:
+                result = await _scan_image(data, mime_type)
+            except Exception as e:
+                print(f"Scan error ({filename}): {type(e).__name__}: {e}")
+                result = {"success": False, "data": None, "message": "识别失败"}
+        return {"index": index, "filename": filename, **result}
+
+    async def generate() -> AsyncIterator[str]:
+        tasks = [
+            asyncio.create_task(scan_one(i, filename, data, mime_type))
+            for i, (filename, data, mime_type) in enumerate(uploads)
+        ]
+        rows = []
+        succeeded = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item = await finished
+                if item["success"] and item["data"]:
+                    try:
+                        row = _scan_to_transaction(item["data"])
+                    except ValidationError as e:
+                        print(f"Invalid scan result ({item['filename']}): {e.error_count()} errors")
+                        item.update(success=False, data=None, message="识别结果无效，请手动录入")
+                        row = None
+                    # 回退的空结果没有金额，不计入成功，也不入账
+                    if row is not None:
+                        succeeded += 1
+                        # 近似匹配的结果需用户核对，不自动入账
+                        if create and not item.get("approximate"):
+                            rows.append(row)
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            # 客户端断开时取消尚未完成的识别
+            for task in tasks:
+                task.cancel()
+
+        created = 0
+        if rows:
+            try:
+                created = await _create_scanned_transactions(rows)
+            except Exception as e:
+                print(f"Create scanned transactions error: {e}")
+        yield json.dumps({
+            "done": True,
+            "total": len(uploads),
+            "succeeded": succeeded,
+            "created": created
+        }) + "\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+
 async def ai_vision_parse_receipt(base64_image: str, mime_type: str) -> Optional[dict]:
     """使用 AI 视觉模型解析收据图片"""
     prompt = """这是一张支付截图或消费账单。请告诉我：
@@ -223,49 +426,34 @@ async def ai_vision_parse_receipt(base64_image: str, mime_type: str) -> Optional
 
 重要提示：请仔细看图片中显示的金额数字（¥符号后面的数字），并准确填写到amount字段中。"""
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {AI_API_KEY}"
-    }
-
-    json_data = {
-        "model": AI_VISION_MODEL,
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:{mime_type};base64,{base64_image}"
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime_type};base64,{base64_image}"
                     }
-                ]
-            }
-        ],
-        "temperature": 0.2,
-        "max_tokens": 200
-    }
-
-    print(f"Calling Vision AI: {AI_API_BASE}/chat/completions with model {AI_VISION_MODEL}")
-
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(
-        executor,
-        sync_ai_request,
-        f"{AI_API_BASE}/chat/completions",
-        headers,
-        json_data,
-        60
+                },
+                {
+                    "type": "text",
+                    "text": prompt
+                }
+            ]
+        }
+    ]
+
+    content = await llm_router.complete(
+        TASK_VISION,
+        messages,
+        temperature=0.2,
+        max_tokens=200,
+        deadline=AI_VISION_DEADLINE
     )
 
-    if result:
+    if content:
         try:
-            content = result["choices"][0]["message"]["content"]
             print(f"Vision AI response: {content}")
 
             # 尝试提取 JSON
@@ -315,41 +503,115 @@ async def ai_vision_parse_receipt(base64_image: str, mime_type: str) -> Optional
     return None
 
 
+def _spending_analysis_reply(summary: Optional[FinanceSummary]) -> str:
+    """根据真实数据生成本月花费分析"""
+    if summary is None:
+        return "暂时无法读取您的账单数据，请稍后再试~ 🐷"
+    if summary.expense <= 0:
+        return "本月还没有支出记录哦~ 记下每一笔花费，小猪才能帮你分析 🐷"
+
+    lines = [f"本月到目前为止您共支出 {summary.expense:.2f} 元，收入 {summary.income:.2f} 元，共 {summary.count} 笔记录。"]
+    if summary.top_categories:
+        top_name, top_amount = summary.top_categories[0]
+        lines.append(f"{top_name}支出占比最高，{top_amount:.2f} 元（{top_amount / summary.expense * 100:.0f}%）。")
+    change = summary.expense_change
+    if change is not None:
+        if change > 0.1:
+            lines.append(f"比上月同期多花了 {change * 100:.0f}%，注意控制一下哦~")
+        elif change < -0.1:
+            lines.append(f"比上月同期少花了 {-change * 100:.0f}%，继续保持！🎉")
+        else:
+            lines.append("和上月同期基本持平~")
+    return "\n".join(lines) + " 🐷"
+
+
+def fallback_chat_reply(query: str, summary: Optional[FinanceSummary] = None) -> str:
+    """未配置 AI 或调用失败时的预设回复"""
+    responses = {
+        "本月花费分析": _spending_analysis_reply(summary),
+        "省钱建议": "建议您：\n1. 📝 记录每笔支出，了解消费习惯\n2. 💰 设定月度预算\n3. 🛒 减少冲动消费\n4. 🎁 多利用优惠活动",
+        "理财建议": "建议将收入分为：\n• 50% 日常开支\n• 30% 储蓄\n• 20% 投资理财\n\n先建立应急基金，再考虑其他投资方式~ 📈"
+    }
+
+    # 关键词匹配
+    for key, value in responses.items():
+        if key in query or any(k in query for k in key):
+            return value
+
+    return f"收到您的问题啦~ 目前 AI 助手还在学习中，暂时无法回答「{query}」\n\n💡 提示：配置 AI_API_KEY 环境变量可启用智能回复功能"
+
+
+async def _load_finance_summary(db: AsyncSession) -> Optional[FinanceSummary]:
+    """读取缓存的财务概况；失败时不影响对话"""
+    try:
+        return await get_finance_summary(db, user_id=1)
+    except Exception as e:
+        print(f"Finance summary error: {e}")
+        return None
+
+
 @router.post("/chat")
-async def ai_chat(request: AIQueryRequest):
+async def ai_chat(request: AIQueryRequest, db: AsyncSession = Depends(get_async_db)):
     """AI 理财助手对话"""
     query = request.query
     history = request.history or []
+    summary = await _load_finance_summary(db)
 
-    # 如果配置了 AI API，使用真实 AI
-    if AI_API_KEY or USE_OLLAMA:
+    # 如果配置了 AI API 或本地模型可用，使用真实 AI
+    if llm_router.enabled(TASK_CHAT):
         try:
-            reply = await ai_chat_completion(query, history)
+            reply = await ai_chat_completion(query, history, summary)
             if reply:
                 return {"reply": reply, "ai_powered": True}
         except Exception as e:
             print(f"AI chat error: {e}")
 
     # 回退到预设回复
-    responses = {
-        "本月花费分析": "根据您本月的消费记录，餐饮支出占比最高，建议适当控制外卖频率，可以节省不少开支哦~ 🐷",
-        "省钱建议": "建议您：\n1. 📝 记录每笔支出，了解消费习惯\n2. 💰 设定月度预算\n3. 🛒 减少冲动消费\n4. 🎁 多利用优惠活动",
-        "理财建议": "建议将收入分为：\n• 50% 日常开支\n• 30% 储蓄\n• 20% 投资理财\n\n先建立应急基金，再考虑其他投资方式~ 📈"
-    }
+    return {"reply": fallback_chat_reply(query, summary), "ai_powered": False}
 
-    # 关键词匹配
-    for key, value in responses.items():
-        if key in query or any(k in query for k in key):
-            return {"reply": value, "ai_powered": False}
 
-    reply = f"收到您的问题啦~ 目前 AI 助手还在学习中，暂时无法回答「{query}」\n\n💡 提示：配置 AI_API_KEY 环境变量可启用智能回复功能"
+def _sse_event(data: dict) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    return {"reply": reply, "ai_powered": False}
 
+@router.post("/chat/stream")
+async def ai_chat_stream(request: AIQueryRequest, db: AsyncSession = Depends(get_async_db)):
+    """AI 理财助手对话（Server-Sent Events 流式输出）
 
-async def ai_chat_completion(query: str, history: List[dict]) -> Optional[str]:
-    """调用 AI API 进行对话"""
-    system_prompt = """你是一个可爱的记账助手"小猪"🐷，帮助用户管理财务、分析消费习惯、提供理财建议。
+    事件格式：data: {"delta": "..."} 逐段输出回复，
+    最后一条为 data: {"done": true, "ai_powered": ...}。
+    """
+    query = request.query
+    history = request.history or []
+    summary = await _load_finance_summary(db)
+
+    async def event_stream():
+        ai_powered = False
+        if llm_router.enabled(TASK_CHAT):
+            try:
+                async for delta in ai_chat_completion_stream(query, history, summary):
+                    ai_powered = True
+                    yield _sse_event({"delta": delta})
+            except Exception as e:
+                print(f"AI chat stream error: {type(e).__name__}: {e}")
+
+        if not ai_powered:
+            # 回退到预设回复
+            yield _sse_event({"delta": fallback_chat_reply(query, summary)})
+
+        yield _sse_event({"done": True, "ai_powered": ai_powered})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            # 禁止反向代理缓冲，保证逐段送达
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+CHAT_SYSTEM_PROMPT = """你是一个可爱的记账助手"小猪"🐷，帮助用户管理财务、分析消费习惯、提供理财建议。
 
 你的特点：
 - 说话友善、可爱，适当使用 emoji
@@ -362,6 +624,16 @@ async def ai_chat_completion(query: str, history: List[dict]) -> Optional[str]:
 - 适当分段，易于阅读
 - 给出具体可操作的建议"""
 
+
+def build_chat_messages(
+    query: str,
+    history: List[dict],
+    summary: Optional[FinanceSummary] = None
+) -> List[dict]:
+    """构造对话消息；有财务概况时附加到系统提示词"""
+    system_prompt = CHAT_SYSTEM_PROMPT
+    if summary is not None:
+        system_prompt += "\n\n" + format_finance_summary(summary)
     messages = [{"role": "system", "content": system_prompt}]
 
     # 添加历史记录
@@ -369,46 +641,126 @@ async def ai_chat_completion(query: str, history: List[dict]) -> Optional[str]:
         messages.append({"role": h.get("role", "user"), "content": h.get("content", "")})
 
     messages.append({"role": "user", "content": query})
+    return messages
+
+
+async def ai_chat_completion(
+    query: str,
+    history: List[dict],
+    summary: Optional[FinanceSummary] = None
+) -> Optional[str]:
+    """调用 AI 进行对话"""
+    return await llm_router.complete(
+        TASK_CHAT,
+        build_chat_messages(query, history, summary),
+        temperature=0.7,
+        max_tokens=500,
+        deadline=AI_CHAT_DEADLINE
+    )
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {AI_API_KEY}"
-    }
-    json_data = {
-        "model": AI_MODEL,
-        "messages": messages,
-        "temperature": 0.7,
-        "max_tokens": 500
-    }
 
-    print(f"Calling AI API: {AI_API_BASE}/chat/completions with model {AI_MODEL}")
+async def ai_chat_completion_stream(
+    query: str,
+    history: List[dict],
+    summary: Optional[FinanceSummary] = None
+) -> AsyncIterator[str]:
+    """流式对话，逐段产出回复内容"""
+    async for delta in llm_router.stream(
+        TASK_CHAT,
+        build_chat_messages(query, history, summary),
+        temperature=0.7,
+        max_tokens=500,
+        deadline=AI_CHAT_DEADLINE
+    ):
+        yield delta
+
+
+def _submit_job(kind: str, func, priority: int, callback_url: Optional[str]) -> JSONResponse:
+    if callback_url:
+        try:
+            check_callback_url(callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        job = job_manager.submit(kind, func, priority, callback_url)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="任务队列已满，请稍后重试",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
 
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(
-        executor,
-        sync_ai_request,
-        f"{AI_API_BASE}/chat/completions",
-        headers,
-        json_data,
-        60
-    )
+@router.post("/jobs/parse-voice")
+async def submit_parse_voice_job(request: VoiceParseJobRequest):
+    """异步解析语音文本，立即返回任务 ID"""
+    async def run():
+        response = await parse_voice_text(VoiceParseRequest(text=request.text))
+        return response.model_dump()
 
-    if result:
-        try:
-            return result["choices"][0]["message"]["content"]
-        except Exception as e:
-            print(f"Parse error: {e}")
-    return None
+    return _submit_job("parse_voice", run, LANE_VOICE, request.callback_url)
+
+
+@router.post("/jobs/scan-receipt")
+async def submit_scan_receipt_job(
+    file: UploadFile = File(...),
+    callback_url: Optional[str] = Form(None)
+):
+    """异步扫描小票，立即返回任务 ID；结果与 /scan-receipt 相同"""
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="请上传图片文件")
+    image_data = await file.read()
+    mime_type = file.content_type or "image/jpeg"
+
+    async def run():
+        return await _scan_image(image_data, mime_type)
+
+    return _submit_job("scan_receipt", run, LANE_VISION, callback_url)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查询任务状态：queued / running / succeeded / failed"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job.to_dict()
+
+
+@router.get("/cache")
+async def get_ai_cache_stats():
+    """获取语音解析和小票识别缓存的命中情况"""
+    return {
+        "parse_voice": voice_cache.stats(),
+        "scan_receipt": receipt_cache.stats()
+    }
+
+
+@router.post("/keywords/reload")
+async def reload_voice_keywords():
+    """热加载 VOICE_KEYWORDS_FILE 中的自定义关键词"""
+    try:
+        count = reload_keywords()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"关键词文件加载失败: {e}")
+    return {"keywords": count}
 
 
 @router.get("/config")
 async def get_ai_config():
     """获取 AI 配置状态"""
+    local = llm_router.local
+    chat_backends = llm_router.candidates(TASK_CHAT)
     return {
-        "configured": bool(AI_API_KEY),
+        "configured": bool(chat_backends),
         "api_base": AI_API_BASE,
-        "model": AI_MODEL,
+        "model": chat_backends[0].model if chat_backends else AI_MODEL,
         "vision_model": AI_VISION_MODEL,
         "use_ollama": USE_OLLAMA,
-        "ollama_available": False  # Ollama 未启用
+        "ollama_available": bool(local is not None and local.name == "ollama" and local.available),
+        "backends": {
+            "cloud": llm_router.cloud.describe() if llm_router.cloud else None,
+            "local": local.describe() if local else None
+        }
     }
@@ -0,0 +1,58 @@
+"""
+内部运行指标
+
+GET /internal/metrics 汇总数据库连接池、各级缓存、异步任务队列和 AI 调用的状态。
+需设置 METRICS_TOKEN 并携带 Authorization: Bearer <token>（或 X-Metrics-Token 头），
+未设置时接口拒绝所有访问。
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from app.pool_metrics import pool_metrics
+from app.services import stats_cache
+from app.services.voice_cache import voice_cache
+from app.services.receipt_cache import receipt_cache
+from app.services.jobs import job_manager
+from app.services.categories import category_cache
+from app.services.resilience import ai_breaker
+from app.routers.ai import parse_batcher
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+router = APIRouter()
+
+
+def require_metrics_token(
+    authorization: Optional[str] = Header(None),
+    x_metrics_token: Optional[str] = Header(None)
+):
+    """未配置 METRICS_TOKEN 时拒绝访问，避免默认对外暴露连接池、缓存和队列状态"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=403, detail="未配置 METRICS_TOKEN，内部指标接口已禁用")
+    token = x_metrics_token or ""
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="无效的指标访问令牌")
+
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_token)])
+async def get_metrics():
+    """内部指标：连接池等待时间高而查询正常时说明连接池不足"""
+    return {
+        "db_pools": {name: metrics.stats() for name, metrics in pool_metrics.items()},
+        "caches": {
+            "stats": stats_cache.stats(),
+            "parse_voice": voice_cache.stats(),
+            "scan_receipt": receipt_cache.stats(),
+            "categories": category_cache.stats()
+        },
+        "jobs": job_manager.stats(),
+        "ai": {
+            "circuit_breaker": ai_breaker.stats(),
+            "parse_batcher": parse_batcher.stats()
+        }
+    }
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from datetime import date, datetime, timedelta
 from typing import List
 from calendar import monthrange
 
-from app.database import get_db
-from app.models import Transaction, TransactionType
+from app.database import get_async_db
+from app.models import DailyRollup, TransactionType
 from app.schemas import MonthlyStats, CategoryStats
+from app.money import from_cents, percentage
+from app.services import get_data_version, get_transaction_totals, stats_cache, month_tags, months_between
+from app.services.categories import category_cache
 
 router = APIRouter()
 
@@ -16,7 +19,7 @@ router = APIRouter()
 async def get_monthly_stats(
     year: int = None,
     month: int = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取月度统计"""
     if not year:
@@ -29,37 +32,24 @@ async def get_monthly_stats(
     _, last_day = monthrange(year, month)
     end_date = date(year, month, last_day)
 
-    # 查询收入 - 使用字符串值比较以确保PostgreSQL兼容性
-    income_result = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == 1,
-        Transaction.type == 'income',
-        Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).scalar()
-    income = float(income_result) if income_result else 0.0
-
-    # 查询支出 - 使用字符串值比较以确保PostgreSQL兼容性
-    expense_result = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == 1,
-        Transaction.type == 'expense',
-        Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).scalar()
-    expense = float(expense_result) if expense_result else 0.0
-
-    # 查询交易数量
-    count = db.query(func.count(Transaction.id)).filter(
-        Transaction.user_id == 1,
-        Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).scalar() or 0
-
-    return MonthlyStats(
-        balance=income - expense,
-        income=income,
-        expense=expense,
-        transaction_count=count
+    cache_key = (1, "monthly", await get_data_version(db, 1), year, month)
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    tags = month_tags(1, [(year, month)])
+    generation = stats_cache.generation(tags)
+
+    # 单次条件聚合查询收入、支出和交易数量
+    totals = await get_transaction_totals(db, user_id=1, start_date=start_date, end_date=end_date)
+
+    result = MonthlyStats(
+        balance=totals.balance,
+        income=totals.income,
+        expense=totals.expense,
+        transaction_count=totals.count
     )
+    stats_cache.set(cache_key, result, tags=tags, generation=generation)
+    return result
 
 
 @router.get("/category", response_model=List[CategoryStats])
@@ -67,7 +57,7 @@ async def get_category_stats(
     type: TransactionType = TransactionType.expense,
     year: int = None,
     month: int = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取分类统计"""
     if not year:
@@ -83,48 +73,69 @@ async def get_category_stats(
     # 使用字符串值比较以确保PostgreSQL兼容性
     type_value = type.value if hasattr(type, 'value') else type
 
-    results = db.query(
-        Transaction.category,
-        func.sum(Transaction.amount).label('amount'),
-        func.count(Transaction.id).label('count')
-    ).filter(
-        Transaction.user_id == 1,
-        Transaction.type == type_value,
-        Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).group_by(Transaction.category).all()
-
-    total = sum(r.amount for r in results) if results else 0
-
-    return [
-        CategoryStats(
-            category=r.category,
-            amount=float(r.amount),
-            percentage=round(float(r.amount) / total * 100, 1) if total > 0 else 0,
-            count=r.count
-        )
-        for r in results
-    ]
+    cache_key = (1, "category", await get_data_version(db, 1), type_value, year, month)
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    tags = month_tags(1, [(year, month)])
+    generation = stats_cache.generation(tags)
+
+    # 读取按日汇总表，开销与天数相关而与交易笔数无关；金额按整数分精确求和
+    # 按整数 category_id 分组，名称和图标、颜色由分类缓存补全
+    results = (await db.execute(select(
+        DailyRollup.category_id,
+        func.sum(DailyRollup.amount_cents).label('amount_cents'),
+        func.sum(DailyRollup.count).label('count')
+    ).where(
+        DailyRollup.user_id == 1,
+        DailyRollup.type == type_value,
+        DailyRollup.date >= start_date,
+        DailyRollup.date <= end_date
+    ).group_by(DailyRollup.category_id))).all()
+    await category_cache.ensure(db, [r.category_id for r in results])
+
+    total = sum(r.amount_cents for r in results) if results else 0
+
+    result = []
+    for r in results:
+        info = category_cache.get(r.category_id)
+        result.append(CategoryStats(
+            category=info.name if info else "",
+            amount=from_cents(r.amount_cents),
+            percentage=percentage(r.amount_cents, total) if total > 0 else 0,
+            count=r.count,
+            icon=info.icon if info else None,
+            color=info.color if info else None
+        ))
+    stats_cache.set(cache_key, result, tags=tags, generation=generation)
+    return result
 
 
 @router.get("/trend")
 async def get_trend_stats(
     days: int = 7,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取趋势统计（近N天）"""
     end_date = date.today()
     start_date = end_date - timedelta(days=days - 1)
 
-    results = db.query(
-        Transaction.date,
-        Transaction.type,
-        func.sum(Transaction.amount).label('amount')
-    ).filter(
-        Transaction.user_id == 1,
-        Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).group_by(Transaction.date, Transaction.type).all()
+    cache_key = (1, "trend", await get_data_version(db, 1), start_date, end_date)
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    tags = month_tags(1, months_between(start_date, end_date))
+    generation = stats_cache.generation(tags)
+
+    results = (await db.execute(select(
+        DailyRollup.date,
+        DailyRollup.type,
+        func.sum(DailyRollup.amount_cents).label('amount_cents')
+    ).where(
+        DailyRollup.user_id == 1,
+        DailyRollup.date >= start_date,
+        DailyRollup.date <= end_date
+    ).group_by(DailyRollup.date, DailyRollup.type))).all()
 
     # 构建日期列表
     date_list = []
@@ -140,12 +151,20 @@ async def get_trend_stats(
     for r in results:
         date_str = r.date.strftime('%m/%d')
         if r.type == 'expense' or (hasattr(r.type, 'value') and r.type.value == 'expense'):
-            expense_data[date_str] = float(r.amount)
+            expense_data[date_str] = from_cents(r.amount_cents)
         else:
-            income_data[date_str] = float(r.amount)
+            income_data[date_str] = from_cents(r.amount_cents)
 
-    return {
+    result = {
         "dates": date_list,
         "expense": list(expense_data.values()),
         "income": list(income_data.values())
     }
+    stats_cache.set(cache_key, result, tags=tags, generation=generation)
+    return result
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """获取统计缓存的命中情况"""
+    return stats_cache.stats()
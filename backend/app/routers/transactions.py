@@ -1,64 +1,130 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List
+from pydantic import ValidationError
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
 from datetime import date
+import base64
+import binascii
 import csv
 import io
+import tempfile
 
-from app.database import get_db
+from app.database import get_async_db, get_async_write_db, AsyncSessionLocal
 from app.models import Transaction, TransactionType
 from app.schemas import TransactionCreate, TransactionUpdate, TransactionResponse
+from app.money import from_cents
+from app.services import (
+    apply_transaction,
+    invalidate_dates,
+    bump_data_version,
+    bulk_insert_transactions,
+    BulkInsertError
+)
+from app.services.categories import category_cache
 
 router = APIRouter()
 
 
+async def _get_user_transaction(db: AsyncSession, transaction_id: int) -> Optional[Transaction]:
+    transaction = await db.scalar(select(Transaction).where(
+        Transaction.id == transaction_id,
+        Transaction.user_id == 1
+    ))
+    if transaction:
+        await category_cache.ensure(db, [transaction.category_id])
+    return transaction
+
+
+async def _resolve_category(db: AsyncSession, data: dict, type=None) -> dict:
+    """把输入中的分类名称换成 category_id"""
+    if "category" in data:
+        data["category_id"] = await category_cache.resolve_id(db, data.pop("category"), type)
+    return data
+
+
 @router.post("/", response_model=TransactionResponse)
 async def create_transaction(
     transaction: TransactionCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_write_db)
 ):
     """创建新交易记录"""
     db_transaction = Transaction(
         user_id=1,  # TODO: 从认证中获取
-        **transaction.model_dump()
+        **await _resolve_category(db, transaction.model_dump(), transaction.type)
     )
     db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
+    # 汇总表与交易在同一事务中更新
+    await apply_transaction(db, db_transaction)
+    await bump_data_version(db, 1)
+    await db.commit()
+    invalidate_dates(1, [db_transaction.date])
+    await db.refresh(db_transaction)
     return db_transaction
 
 
+def encode_cursor(transaction: Transaction) -> str:
+    """将 (date, id) 编码为不透明的分页游标"""
+    raw = f"{transaction.date.isoformat()}:{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """解析分页游标，格式错误时返回 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        date_str, id_str = raw.split(":")
+        return date.fromisoformat(date_str), int(id_str)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
 @router.get("/", response_model=List[TransactionResponse])
 async def get_transactions(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
     type: TransactionType = None,
     start_date: date = None,
     end_date: date = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取交易记录列表"""
-    query = db.query(Transaction).filter(Transaction.user_id == 1)
+    """获取交易记录列表
+
+    传入 cursor 时按 (date, id) 游标翻页，忽略 skip，任意深度的翻页耗时一致；
+    不传 cursor 时保持原有的 skip/limit 行为。下一页游标通过 X-Next-Cursor 响应头返回。
+    """
+    stmt = select(Transaction).where(Transaction.user_id == 1)
 
     if type:
-        query = query.filter(Transaction.type == type)
+        stmt = stmt.where(Transaction.type == type)
     if start_date:
-        query = query.filter(Transaction.date >= start_date)
+        stmt = stmt.where(Transaction.date >= start_date)
     if end_date:
-        query = query.filter(Transaction.date <= end_date)
+        stmt = stmt.where(Transaction.date <= end_date)
 
-    transactions = query.order_by(Transaction.date.desc(), Transaction.id.desc()).offset(skip).limit(limit).all()
+    stmt = stmt.order_by(Transaction.date.desc(), Transaction.id.desc())
+    if cursor:
+        # 行值比较可直接利用 (user_id, date desc, id desc) 索引定位
+        stmt = stmt.where(tuple_(Transaction.date, Transaction.id) < decode_cursor(cursor))
+    elif skip:
+        stmt = stmt.offset(skip)
+
+    transactions = (await db.scalars(stmt.limit(limit))).all()
+    await category_cache.ensure(db, {t.category_id for t in transactions})
+
+    if transactions and len(transactions) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(transactions[-1])
     return transactions
 
 
 @router.get("/{transaction_id}", response_model=TransactionResponse)
-async def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
+async def get_transaction(transaction_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取单个交易记录"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id,
-        Transaction.user_id == 1
-    ).first()
+    transaction = await _get_user_transaction(db, transaction_id)
 
     if not transaction:
         raise HTTPException(status_code=404, detail="交易记录不存在")
@@ -69,93 +135,298 @@ async def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
 async def update_transaction(
     transaction_id: int,
     transaction_update: TransactionUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_write_db)
 ):
     """更新交易记录"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id,
-        Transaction.user_id == 1
-    ).first()
+    transaction = await _get_user_transaction(db, transaction_id)
 
     if not transaction:
         raise HTTPException(status_code=404, detail="交易记录不存在")
 
-    update_data = transaction_update.model_dump(exclude_unset=True)
+    update_data = await _resolve_category(
+        db,
+        transaction_update.model_dump(exclude_unset=True),
+        transaction_update.type or transaction.type
+    )
+
+    # 先扣除旧值再计入新值，汇总表与交易在同一事务中更新
+    old_date = transaction.date
+    await apply_transaction(db, transaction, sign=-1)
     for key, value in update_data.items():
         setattr(transaction, key, value)
+    await apply_transaction(db, transaction)
+    await bump_data_version(db, 1)
 
-    db.commit()
-    db.refresh(transaction)
+    await db.commit()
+    invalidate_dates(1, [old_date, transaction.date])
+    await db.refresh(transaction)
     return transaction
 
 
 @router.delete("/{transaction_id}")
-async def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
+async def delete_transaction(transaction_id: int, db: AsyncSession = Depends(get_async_write_db)):
     """删除交易记录"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id,
-        Transaction.user_id == 1
-    ).first()
+    transaction = await _get_user_transaction(db, transaction_id)
 
     if not transaction:
         raise HTTPException(status_code=404, detail="交易记录不存在")
 
-    db.delete(transaction)
-    db.commit()
+    transaction_date = transaction.date
+    await apply_transaction(db, transaction, sign=-1)
+    await db.delete(transaction)
+    await bump_data_version(db, 1)
+    await db.commit()
+    invalidate_dates(1, [transaction_date])
     return {"message": "删除成功"}
 
 
-@router.get("/export/csv")
-async def export_transactions_csv(
-    start_date: date = None,
-    end_date: date = None,
-    db: Session = Depends(get_db)
-):
-    """导出交易记录为CSV"""
-    query = db.query(Transaction).filter(Transaction.user_id == 1)
+# CSV 导出格式（导入时也使用相同的格式）
+CSV_HEADER = ['日期', '类型', '分类', '金额', '备注', '来源']
+TYPE_LABELS = {'income': '收入', 'expense': '支出'}
+SOURCE_LABELS = {'manual': '手动', 'voice': '语音', 'photo': '拍照', 'ai': 'AI'}
 
-    if start_date:
-        query = query.filter(Transaction.date >= start_date)
-    if end_date:
-        query = query.filter(Transaction.date <= end_date)
+# 每批从服务端游标拉取并编码输出的行数
+EXPORT_BATCH_SIZE = 1000
+
+
+async def iter_transactions_csv(start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """逐批生成 CSV 字节块，内存占用与导出总量无关
+
+    生成器在响应发送期间才开始迭代，此时请求依赖注入的会话可能已关闭，
+    因此这里自行管理会话。
+    """
+    async with AsyncSessionLocal() as db:
+        # 分类表很小，导出前整表加载，流式读取期间不再穿插查询
+        await category_cache.load(db)
 
-    transactions = query.order_by(Transaction.date.desc(), Transaction.id.desc()).all()
+        stmt = select(
+            Transaction.date,
+            Transaction.type,
+            Transaction.category_id,
+            Transaction.amount_cents,
+            Transaction.description,
+            Transaction.source
+        ).where(Transaction.user_id == 1)
 
-    # 创建CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
+        if start_date:
+            stmt = stmt.where(Transaction.date >= start_date)
+        if end_date:
+            stmt = stmt.where(Transaction.date <= end_date)
 
-    # 写入表头
-    writer.writerow(['日期', '类型', '分类', '金额', '备注', '来源'])
+        # stream + yield_per 在 PostgreSQL 上使用服务端游标分批读取
+        rows = await db.stream(
+            stmt.order_by(Transaction.date.desc(), Transaction.id.desc())
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
 
-    # 写入数据
-    for t in transactions:
-        # 使用字符串比较以确保PostgreSQL兼容性
-        type_str = t.type.value if hasattr(t.type, 'value') else t.type
-        type_name = '收入' if type_str == 'income' else '支出'
-        source_map = {'manual': '手动', 'voice': '语音', 'photo': '拍照', 'ai': 'AI'}
-        source_value = t.source.value if hasattr(t.source, 'value') else t.source
-        source_name = source_map.get(source_value, source_value) if t.source else '-'
+        output = io.StringIO()
+        writer = csv.writer(output)
 
-        writer.writerow([
-            t.date.strftime('%Y-%m-%d'),
-            type_name,
-            t.category,
-            f'{t.amount:.2f}',
-            t.description or '-',
-            source_name
-        ])
+        # 添加BOM以支持Excel打开中文
+        output.write('\ufeff')
+        writer.writerow(CSV_HEADER)
 
-    output.seek(0)
+        # 每次取出 EXPORT_BATCH_SIZE 行，编码后立即输出
+        async for batch in rows.partitions():
+            for t in batch:
+                # 使用字符串比较以确保PostgreSQL兼容性
+                type_str = t.type.value if hasattr(t.type, 'value') else t.type
+                source_value = t.source.value if hasattr(t.source, 'value') else t.source
+                source_name = SOURCE_LABELS.get(source_value, source_value) if t.source else '-'
 
-    # 添加BOM以支持Excel打开中文
-    bom = '\ufeff'
-    content = bom + output.getvalue()
+                writer.writerow([
+                    t.date.strftime('%Y-%m-%d'),
+                    TYPE_LABELS.get(type_str, '支出'),
+                    category_cache.name(t.category_id),
+                    f'{from_cents(t.amount_cents):.2f}',
+                    t.description or '-',
+                    source_name
+                ])
 
+            yield output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate(0)
+
+        if output.tell():
+            yield output.getvalue().encode('utf-8')
+
+
+@router.get("/export/csv")
+async def export_transactions_csv(
+    start_date: date = None,
+    end_date: date = None
+):
+    """导出交易记录为CSV（流式输出）"""
     return StreamingResponse(
-        io.BytesIO(content.encode('utf-8')),
+        iter_transactions_csv(start_date, end_date),
         media_type='text/csv',
         headers={
             'Content-Disposition': 'attachment; filename=transactions.csv'
         }
     )
+
+
+# 导入时由标签反查枚举值，同时兼容直接填写英文枚举值
+TYPE_BY_LABEL = {**{v: k for k, v in TYPE_LABELS.items()}, **{k: k for k in TYPE_LABELS}}
+SOURCE_BY_LABEL = {**{v: k for k, v in SOURCE_LABELS.items()}, **{k: k for k in SOURCE_LABELS}}
+
+# 响应中最多返回的错误行数
+MAX_REPORTED_ERRORS = 200
+
+
+def _csv_row_to_dict(row: List[str]) -> dict:
+    """把导出格式的一行 CSV 转为 TransactionCreate 的输入"""
+    if len(row) < 4:
+        raise ValueError("列数不足")
+    date_str, type_label, category, amount = row[:4]
+    description = row[4] if len(row) > 4 else ''
+    source_label = row[5] if len(row) > 5 else ''
+
+    if type_label.strip() not in TYPE_BY_LABEL:
+        raise ValueError(f"未知类型: {type_label}")
+    source_label = source_label.strip()
+    if source_label not in ('', '-') and source_label not in SOURCE_BY_LABEL:
+        raise ValueError(f"未知来源: {source_label}")
+
+    data = {
+        'date': date_str.strip(),
+        'type': TYPE_BY_LABEL[type_label.strip()],
+        'category': category.strip(),
+        'amount': amount.strip(),
+        'description': None if description.strip() in ('', '-') else description,
+    }
+    if source_label not in ('', '-'):
+        data['source'] = SOURCE_BY_LABEL[source_label]
+    return data
+
+
+def _iter_csv_records(text_stream):
+    """逐行读取 CSV（跳过表头），产出 (行号, 数据字典或异常)"""
+    reader = csv.reader(text_stream)
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        # 表头行（BOM 已由 utf-8-sig 解码去除）
+        if row[0].strip() == CSV_HEADER[0]:
+            continue
+        try:
+            yield reader.line_num, _csv_row_to_dict(row)
+        except ValueError as e:
+            yield reader.line_num, e
+
+
+def _iter_json_records(items):
+    for i, item in enumerate(items, 1):
+        if isinstance(item, dict):
+            yield i, item
+        else:
+            yield i, ValueError("每一项必须是对象")
+
+
+def _validated_rows(records, errors: List[dict], counter: dict):
+    """校验每条记录，错误记录写入 errors 并跳过"""
+    for row_number, record in records:
+        counter['total'] += 1
+        if isinstance(record, Exception):
+            error = str(record)
+        else:
+            try:
+                yield TransactionCreate.model_validate(record).model_dump()
+                continue
+            except ValidationError as e:
+                error = "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                )
+        counter['failed'] += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'row': row_number, 'error': error})
+
+
+async def _spool_upload(request: Request):
+    """把上传内容写入临时文件（超过内存阈值自动落盘），返回二进制文件对象"""
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith('multipart/form-data'):
+        form = await request.form()
+        upload = form.get('file')
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="请上传 file 字段的 CSV 文件")
+        return upload.file
+
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+@router.post("/bulk")
+async def bulk_import_transactions(
+    request: Request,
+    commit_every_batch: bool = False,
+    db: AsyncSession = Depends(get_async_write_db)
+):
+    """批量导入交易记录
+
+    支持三种请求体：
+    - application/json：TransactionCreate 对象数组
+    - text/csv：与导出接口相同格式的 CSV（可带 BOM，类型/来源使用中文标签）
+    - multipart/form-data：file 字段上传上述 CSV 文件
+
+    逐行校验，错误行跳过并在响应中报告，其余行分批插入。
+    默认全部在一个事务中提交；commit_every_batch=true 时每批提交一次，
+    中途失败时错误响应的 committed 为已保存的行数（按输入顺序的前 committed 条有效记录）。
+    """
+    content_type = request.headers.get('content-type', '')
+
+    if content_type.startswith('application/json'):
+        try:
+            items = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="JSON 格式错误")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="请求体必须是数组")
+        records = _iter_json_records(items)
+    else:
+        raw = await _spool_upload(request)
+        text_stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        records = _iter_csv_records(text_stream)
+
+    errors: List[dict] = []
+    counter = {'total': 0, 'failed': 0}
+    try:
+        result = await bulk_insert_transactions(
+            db,
+            user_id=1,
+            rows=_validated_rows(records, errors, counter),
+            commit_every_batch=commit_every_batch
+        )
+        await db.commit()
+    except BulkInsertError as e:
+        await db.rollback()
+        print(f"Bulk import failed after {e.result.committed} committed rows: {type(e.__cause__).__name__}")
+        encoding_error = isinstance(e.__cause__, UnicodeDecodeError)
+        raise HTTPException(
+            status_code=400 if encoding_error else 500,
+            detail={
+                "message": "文件编码必须为 UTF-8" if encoding_error else "导入中途失败",
+                "total": counter['total'],
+                "committed": e.result.committed,
+                "failed": counter['failed'],
+                "errors": errors
+            }
+        )
+    except UnicodeDecodeError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="文件编码必须为 UTF-8")
+    except Exception:
+        await db.rollback()
+        raise
+
+    invalidate_dates(1, result.month_dates.values())
+
+    return {
+        "total": counter['total'],
+        "inserted": result.inserted,
+        "failed": counter['failed'],
+        "errors": errors
+    }
@@ -1,66 +1,81 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timezone
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timezone
 
-from app.database import get_db
-from app.models import User, Transaction
+from app.database import get_async_db, get_async_write_db, AsyncWriteSessionLocal
+from app.models import User
 from app.schemas import UserCreate, UserResponse
+from app.services import get_data_version, get_transaction_totals, stats_cache, month_tags
 
 router = APIRouter()
 
 
 @router.post("/", response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_write_db)):
     """创建用户"""
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await db.scalar(select(User).where(User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="用户名已存在")
 
     new_user = User(**user.model_dump())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(db: Session = Depends(get_db)):
+async def get_current_user(db: AsyncSession = Depends(get_async_db)):
     """获取当前用户信息"""
     # TODO: 从认证中获取用户ID
-    user = db.query(User).filter(User.id == 1).first()
+    user = await db.scalar(select(User).where(User.id == 1))
     if not user:
+        user = await _create_default_user()
+    return user
+
+
+async def _create_default_user() -> User:
+    """创建默认用户；读会话可能连接只读副本，因此使用写会话"""
+    async with AsyncWriteSessionLocal() as db:
         # 创建默认用户，显式设置id=1以确保PostgreSQL兼容性
-        from sqlalchemy import text
         # 先尝试插入id=1的用户
         try:
             user = User(id=1, username="default", nickname="记账小达人")
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
             # 重置PostgreSQL序列以避免冲突
             try:
-                db.execute(text("SELECT setval(pg_get_serial_sequence('myschema.users', 'id'), COALESCE((SELECT MAX(id) FROM myschema.users), 1))"))
-                db.commit()
+                await db.execute(text("SELECT setval(pg_get_serial_sequence('myschema.users', 'id'), COALESCE((SELECT MAX(id) FROM myschema.users), 1))"))
+                await db.commit()
             except:
                 pass  # SQLite不支持此操作，忽略
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             # 如果插入失败，可能是id冲突，尝试获取任意用户
-            user = db.query(User).first()
+            user = await db.scalar(select(User).limit(1))
             if not user:
                 raise HTTPException(status_code=500, detail="无法创建用户")
     return user
 
 
 @router.get("/stats")
-async def get_user_stats(db: Session = Depends(get_db)):
+async def get_user_stats(db: AsyncSession = Depends(get_async_db)):
     """获取用户统计信息"""
+    # 记账天数按天变化，因此缓存键包含当天日期
+    cache_key = (1, "user_stats", await get_data_version(db, 1), date.today())
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    tags = month_tags(1)
+    generation = stats_cache.generation(tags)
+
     # 尝试获取用户，用于计算记账天数
-    user = db.query(User).filter(User.id == 1).first()
+    user = await db.scalar(select(User).where(User.id == 1))
     if not user:
         # 尝试获取任意用户
-        user = db.query(User).first()
+        user = await db.scalar(select(User).limit(1))
 
     # 计算记账天数 - 使用UTC时间避免时区问题
     days = 0
@@ -75,29 +90,14 @@ async def get_user_stats(db: Session = Depends(get_db)):
         except Exception:
             days = 0
 
-    # 使用与statistics.py完全相同的查询模式
-    # 统计总记录数
-    total_records = db.query(func.count(Transaction.id)).filter(
-        Transaction.user_id == 1
-    ).scalar() or 0
-
-    # 统计总收入 - 使用字符串值比较
-    total_income = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == 1,
-        Transaction.type == 'income'
-    ).scalar()
-    total_income = float(total_income) if total_income else 0.0
-
-    # 统计总支出 - 使用字符串值比较
-    total_expense = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == 1,
-        Transaction.type == 'expense'
-    ).scalar()
-    total_expense = float(total_expense) if total_expense else 0.0
+    # 与statistics.py共用条件聚合，一次查询得到总记录数、总收入和总支出
+    totals = await get_transaction_totals(db, user_id=1)
 
-    return {
+    result = {
         "days": days,
-        "total_records": total_records,
-        "total_income": total_income,
-        "total_expense": total_expense
+        "total_records": totals.count,
+        "total_income": totals.income,
+        "total_expense": totals.expense
     }
+    stats_cache.set(cache_key, result, tags=tags, generation=generation)
+    return result
@@ -1,8 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from datetime import date, datetime
 from typing import Optional
 from enum import Enum
 
+from app.money import MAX_AMOUNT
+
 
 class TransactionType(str, Enum):
     income = "income"
@@ -26,16 +28,25 @@ class TransactionBase(BaseModel):
 
 
 class TransactionCreate(TransactionBase):
-    pass
+    # 写入时校验金额：NaN / ±inf 无法换算为分，上限保证换算后不超出 BIGINT
+    amount: float = Field(gt=0, le=MAX_AMOUNT, allow_inf_nan=False)
 
 
 class TransactionUpdate(BaseModel):
     type: Optional[TransactionType] = None
-    amount: Optional[float] = None
+    amount: Optional[float] = Field(None, gt=0, le=MAX_AMOUNT, allow_inf_nan=False)
     category: Optional[str] = None
     description: Optional[str] = None
     date: Optional[date] = None
 
+    @field_validator("type", "amount", "category", "date", mode="before")
+    @classmethod
+    def reject_null(cls, value):
+        """未传的字段保持不变；显式传 null 不能清空必填字段（如金额被写成 0）"""
+        if value is None:
+            raise ValueError("不能为 null")
+        return value
+
 
 class TransactionResponse(TransactionBase):
     id: int
@@ -76,3 +87,5 @@ class CategoryStats(BaseModel):
     amount: float
     percentage: float
     count: int
+    icon: Optional[str] = None
+    color: Optional[str] = None
@@ -0,0 +1,26 @@
+from .stats import TransactionTotals, get_transaction_totals
+from .rollup import apply_transaction, rebuild_rollup, check_rollup
+from .cache import TTLCache
+from .stats_cache import stats_cache, month_tags, months_between, invalidate_dates
+from .versioning import bump_data_version, get_data_version, make_etag, etag_matches
+from .bulk import bulk_insert_transactions, BulkInsertResult, BulkInsertError
+
+__all__ = [
+    "TransactionTotals",
+    "get_transaction_totals",
+    "apply_transaction",
+    "rebuild_rollup",
+    "check_rollup",
+    "TTLCache",
+    "stats_cache",
+    "month_tags",
+    "months_between",
+    "invalidate_dates",
+    "bump_data_version",
+    "get_data_version",
+    "make_etag",
+    "etag_matches",
+    "bulk_insert_transactions",
+    "BulkInsertResult",
+    "BulkInsertError"
+]
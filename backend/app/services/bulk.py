@@ -0,0 +1,108 @@
+"""
+批量写入交易
+
+使用 Core insert 的 executemany 分批插入，汇总表增量按 (日期, 类型, 分类) 合并后
+在提交前每个键只写一次。调用方负责最终提交事务和失效缓存；
+commit_every_batch 时每批提交后由这里失效已提交月份的缓存。
+"""
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Transaction
+from app.money import to_cents
+
+from .categories import category_cache
+from .rollup import apply_delta
+from .stats_cache import invalidate_dates
+from .versioning import bump_data_version
+
+BULK_BATCH_SIZE = 1000
+
+
+class BulkInsertError(Exception):
+    """commit_every_batch 导入中途失败，此前的批次已提交；原始异常见 __cause__"""
+
+    def __init__(self, result: "BulkInsertResult"):
+        super().__init__(f"bulk insert failed after {result.committed} committed rows")
+        self.result = result
+
+
+class BulkInsertResult:
+    def __init__(self):
+        self.inserted = 0
+        # commit_every_batch 时已提交的行数（按输入顺序的前 committed 条有效记录）
+        self.committed = 0
+        # 每个受影响月份保留一个日期，用于失效统计缓存
+        self.month_dates: Dict[Tuple[int, int], date] = {}
+        # 尚未写入汇总表的增量
+        self._pending_rollup: Dict[tuple, List] = {}
+
+    def _track(self, row: dict) -> None:
+        day = row["date"]
+        self.month_dates.setdefault((day.year, day.month), day)
+        type_value = row["type"].value if hasattr(row["type"], "value") else row["type"]
+        totals = self._pending_rollup.setdefault((day, type_value, row["category_id"]), [0, 0])
+        totals[0] += row["amount_cents"]
+        totals[1] += 1
+
+
+async def _flush(db: AsyncSession, batch: List[dict], result: BulkInsertResult) -> None:
+    await db.execute(insert(Transaction), batch)
+    result.inserted += len(batch)
+    batch.clear()
+
+
+async def _apply_pending(db: AsyncSession, user_id: int, result: BulkInsertResult) -> None:
+    if not result._pending_rollup:
+        return
+    for (day, type_value, category_id), (amount_cents, count) in result._pending_rollup.items():
+        await apply_delta(db, user_id, day, type_value, category_id, amount_cents, count)
+    result._pending_rollup.clear()
+    await bump_data_version(db, user_id)
+
+
+async def bulk_insert_transactions(
+    db: AsyncSession,
+    user_id: int,
+    rows: Iterable[dict],
+    batch_size: int = BULK_BATCH_SIZE,
+    commit_every_batch: bool = False
+) -> BulkInsertResult:
+    """分批插入已校验的交易数据（TransactionCreate.model_dump() 格式）
+
+    commit_every_batch=False 时所有批次处于同一事务；为 True 时每批提交一次，
+    适合超大导入，但中途失败会保留已提交的批次，此时抛出 BulkInsertError，
+    其 result.committed 为已提交的行数。
+    """
+    result = BulkInsertResult()
+    batch: List[dict] = []
+
+    try:
+        for row in rows:
+            # Core insert 只接受列名：金额换算为分，分类名称换算为 id（分类缓存命中时无需查询）
+            row = {**row, "user_id": user_id}
+            row["amount_cents"] = to_cents(row.pop("amount", None))
+            row["category_id"] = await category_cache.resolve_id(db, row.pop("category", None), row["type"])
+            batch.append(row)
+            result._track(row)
+            if len(batch) >= batch_size:
+                await _flush(db, batch, result)
+                if commit_every_batch:
+                    await _apply_pending(db, user_id, result)
+                    await db.commit()
+                    result.committed = result.inserted
+                    # 已提交的数据立即可见，不等整个导入结束再失效缓存
+                    invalidate_dates(user_id, result.month_dates.values())
+
+        if batch:
+            await _flush(db, batch, result)
+        await _apply_pending(db, user_id, result)
+    except Exception as e:
+        if result.committed:
+            raise BulkInsertError(result) from e
+        raise
+
+    return result
@@ -0,0 +1,108 @@
+"""
+进程内缓存：TTL 过期 + LRU 容量淘汰，支持按标签失效和命中统计
+
+注意缓存只在当前进程内有效，多 worker 部署时各自独立，TTL 兜底跨进程的数据变更。
+
+读取与写入并发时，读请求可能在写入前算出结果、在写入失效缓存之后才调用 set，
+旧结果会一直保留到 TTL 过期。为此每个标签有一个代数，invalidate_tags 时加一：
+读请求在计算前用 generation() 取得代数，set 时传入，代数已变化则不写入。
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, copy_values: bool = False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # 为 True 时写入和读取都深拷贝，调用方修改返回值不会影响缓存
+        self.copy_values = copy_values
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._generations: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_sets = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value) if self.copy_values else value
+
+    def generation(self, tags: Iterable[Hashable]) -> Tuple[int, ...]:
+        """这些标签当前的代数，计算结果之前读取，set 时传入"""
+        with self._lock:
+            return self._generation(tags)
+
+    def _generation(self, tags: Iterable[Hashable]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in sorted(set(tags), key=repr))
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        tags: Optional[Iterable[Hashable]] = None,
+        generation: Optional[Tuple[int, ...]] = None
+    ) -> None:
+        tags = frozenset(tags or ())
+        if self.copy_values:
+            value = copy.deepcopy(value)
+        with self._lock:
+            # 计算期间标签已被失效，结果可能已过期，不写入
+            if generation is not None and self._generation(tags) != generation:
+                self.stale_sets += 1
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value, tags)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_tags(self, tags: Iterable[Hashable]) -> int:
+        """删除带有任一指定标签的条目，返回删除数量"""
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [k for k, (_, _, entry_tags) in self._data.items() if entry_tags & tags]
+            for k in stale:
+                del self._data[k]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_sets": self.stale_sets,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0
+            }
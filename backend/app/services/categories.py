@@ -0,0 +1,123 @@
+"""
+分类维度表与内存缓存
+
+交易通过 category_id 引用 categories 表，接口仍以分类名称收发：
+写入前由 resolve_id 把名称换成 id（不存在时在当前事务中创建），
+读取时由缓存把 id 换回名称及图标、颜色。
+
+分类数量很少，缓存保存整张表；在当前事务中新建的分类先记在会话上，
+提交后才加入缓存，回滚则丢弃，缓存中不会出现未提交的 id。
+多进程部署时其他进程新建的分类在 ensure 发现未知 id 时整表重新加载。
+"""
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import Category
+
+# 未分类在汇总表中的 category_id（汇总表主键不允许 NULL）
+UNCATEGORIZED_ID = 0
+
+_PENDING_KEY = "pending_categories"
+
+
+class CategoryInfo(NamedTuple):
+    id: int
+    name: str
+    type: Optional[str]
+    icon: Optional[str]
+    color: Optional[str]
+
+
+def _info(row) -> CategoryInfo:
+    type_value = row.type.value if hasattr(row.type, "value") else row.type
+    return CategoryInfo(row.id, row.name, type_value, row.icon, row.color)
+
+
+def _insert_ignore(dialect: str, values: dict):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(Category).values(**values).on_conflict_do_nothing(index_elements=["name"])
+
+
+class CategoryCache:
+    def __init__(self):
+        self._by_id: Dict[int, CategoryInfo] = {}
+        self._by_name: Dict[str, CategoryInfo] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _add(self, info: CategoryInfo) -> None:
+        with self._lock:
+            self._by_id[info.id] = info
+            self._by_name[info.name] = info
+
+    def get(self, category_id: Optional[int]) -> Optional[CategoryInfo]:
+        return self._by_id.get(category_id) if category_id else None
+
+    def name(self, category_id: Optional[int]) -> str:
+        info = self.get(category_id)
+        return info.name if info else ""
+
+    async def load(self, db: AsyncSession) -> None:
+        """从数据库加载全部分类"""
+        rows = (await db.scalars(select(Category))).all()
+        infos = [_info(row) for row in rows]
+        with self._lock:
+            self._by_id = {info.id: info for info in infos}
+            self._by_name = {info.name: info for info in infos}
+            self.loads += 1
+
+    async def ensure(self, db: AsyncSession, category_ids: Iterable[Optional[int]]) -> None:
+        """确保这些 id 都在缓存中，有未知 id 时重新加载"""
+        if any(cid and cid not in self._by_id for cid in category_ids):
+            await self.load(db)
+
+    async def resolve_id(self, db: AsyncSession, name: Optional[str], type=None) -> Optional[int]:
+        """分类名称 -> id，名称为空时返回 None；不存在时在 db 的当前事务中创建"""
+        name = (name or "").strip()
+        if not name:
+            return None
+        info = self._by_name.get(name)
+        if info:
+            return info.id
+
+        pending = db.info.setdefault(_PENDING_KEY, {})
+        if name in pending:
+            return pending[name].id
+
+        row = await db.scalar(select(Category).where(Category.name == name))
+        if row is not None:
+            # 其他进程已创建并提交
+            info = _info(row)
+            self._add(info)
+            return info.id
+
+        type_value = type.value if hasattr(type, "value") else type
+        await db.execute(_insert_ignore(db.bind.dialect.name, {"name": name, "type": type_value}))
+        row = await db.scalar(select(Category).where(Category.name == name))
+        pending[name] = _info(row)
+        return row.id
+
+    def stats(self) -> dict:
+        return {"size": len(self._by_id), "loads": self.loads}
+
+
+category_cache = CategoryCache()
+
+
+# 会话提交后把本事务新建的分类加入缓存，回滚时丢弃（异步会话底层也是 Session）
+@event.listens_for(Session, "after_commit")
+def _promote_pending_categories(session: Session) -> None:
+    for info in session.info.pop(_PENDING_KEY, {}).values():
+        category_cache._add(info)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_categories(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
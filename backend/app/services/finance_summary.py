@@ -0,0 +1,150 @@
+"""
+AI 对话使用的财务概况
+
+基于按日汇总表计算本月收支、支出前几名分类、与上月同期的变化，结果放入统计缓存，
+交易写入时随月份标签一起失效，因此每条对话消息通常只需一次缓存读取。
+格式化后的文本受字符预算限制，附加到系统提示词中。
+"""
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import DailyRollup
+from app.money import from_cents
+
+from .categories import category_cache
+from .stats_cache import stats_cache, month_tags
+from .versioning import get_data_version
+
+CHAT_CONTEXT_MAX_CHARS = int(os.getenv("CHAT_CONTEXT_MAX_CHARS", "300"))
+TOP_CATEGORIES = 3
+
+
+class FinanceSummary(NamedTuple):
+    today: date
+    income: Decimal
+    expense: Decimal
+    count: int
+    # (分类, 金额)，按金额降序
+    top_categories: List[Tuple[str, Decimal]]
+    # 上月 1 日至同一日期的支出，以及上月全月支出
+    last_month_same_period_expense: Decimal
+    last_month_expense: Decimal
+
+    @property
+    def balance(self) -> Decimal:
+        return self.income - self.expense
+
+    @property
+    def expense_change(self) -> Optional[Decimal]:
+        """相对上月同期的支出变化比例，上月同期无支出时为 None"""
+        if self.last_month_same_period_expense <= 0:
+            return None
+        return self.expense / self.last_month_same_period_expense - 1
+
+
+def _previous_month_start(month_start: date) -> date:
+    return (month_start - timedelta(days=1)).replace(day=1)
+
+
+async def get_finance_summary(db: AsyncSession, user_id: int, today: Optional[date] = None) -> FinanceSummary:
+    today = today or date.today()
+    month_start = today.replace(day=1)
+    last_month_start = _previous_month_start(month_start)
+
+    cache_key = (user_id, "finance_summary", await get_data_version(db, user_id), today)
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    tags = month_tags(user_id, [(today.year, today.month), (last_month_start.year, last_month_start.month)])
+    generation = stats_cache.generation(tags)
+
+    # 上月初至今天按日、类型、分类汇总的行数很少，在内存中按整数分聚合
+    rows = (await db.execute(select(
+        DailyRollup.date,
+        DailyRollup.type,
+        DailyRollup.category_id,
+        DailyRollup.amount_cents,
+        DailyRollup.count
+    ).where(
+        DailyRollup.user_id == user_id,
+        DailyRollup.date >= last_month_start,
+        DailyRollup.date <= today
+    ))).all()
+    await category_cache.ensure(db, [row.category_id for row in rows])
+
+    income = expense = 0
+    count = 0
+    categories = {}
+    last_same_period = last_total = 0
+    for row in rows:
+        type_value = row.type.value if hasattr(row.type, "value") else row.type
+        amount = row.amount_cents or 0
+        if row.date >= month_start:
+            count += row.count or 0
+            if type_value == "income":
+                income += amount
+            else:
+                expense += amount
+                category = category_cache.name(row.category_id) or "未分类"
+                categories[category] = categories.get(category, 0) + amount
+        elif type_value == "expense":
+            last_total += amount
+            if row.date.day <= today.day:
+                last_same_period += amount
+
+    summary = FinanceSummary(
+        today=today,
+        income=from_cents(income),
+        expense=from_cents(expense),
+        count=count,
+        top_categories=[
+            (name, from_cents(cents))
+            for name, cents in sorted(categories.items(), key=lambda item: item[1], reverse=True)[:TOP_CATEGORIES]
+        ],
+        last_month_same_period_expense=from_cents(last_same_period),
+        last_month_expense=from_cents(last_total)
+    )
+    stats_cache.set(cache_key, summary, tags=tags, generation=generation)
+    return summary
+
+
+def _money(amount: Decimal) -> str:
+    return f"{amount:.2f}".rstrip("0").rstrip(".")
+
+
+def format_finance_summary(summary: FinanceSummary, max_chars: int = CHAT_CONTEXT_MAX_CHARS) -> str:
+    """生成紧凑的中文概况；超出预算时依次减少分类条目，最后截断"""
+    header = (
+        f"用户本月（{summary.today.year}年{summary.today.month}月1日至{summary.today.day}日）财务概况："
+        f"收入{_money(summary.income)}元，支出{_money(summary.expense)}元，"
+        f"结余{_money(summary.balance)}元，共{summary.count}笔。"
+    )
+
+    trend = ""
+    change = summary.expense_change
+    if change is not None:
+        trend = f"支出较上月同期{'增加' if change >= 0 else '减少'}{abs(change) * 100:.0f}%。"
+    if summary.last_month_expense > 0:
+        trend += f"上月全月支出{_money(summary.last_month_expense)}元。"
+
+    categories = list(summary.top_categories)
+    while True:
+        parts = [header]
+        if categories and summary.expense > 0:
+            items = "、".join(
+                f"{name}{_money(amount)}元（{amount / summary.expense * 100:.0f}%）"
+                for name, amount in categories
+            )
+            parts.append(f"支出最多的分类：{items}。")
+        parts.append(trend)
+        text = "".join(parts)
+        if len(text) <= max_chars or not categories:
+            break
+        categories.pop()
+
+    return text[:max_chars]
@@ -0,0 +1,62 @@
+"""
+共享的异步 HTTP 客户端
+
+由应用 lifespan 创建和关闭，所有 AI 请求复用同一个连接池（keep-alive，可选 HTTP/2），
+避免每次调用都重新进行 TCP + TLS 握手。
+"""
+import os
+from typing import Optional
+
+import httpx
+
+# 连接池配置
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+AI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+AI_KEEPALIVE_EXPIRY = float(os.getenv("AI_KEEPALIVE_EXPIRY", "60"))
+# 连接池已满时等待空闲连接的秒数
+AI_POOL_TIMEOUT = float(os.getenv("AI_POOL_TIMEOUT", "10"))
+AI_HTTP2 = os.getenv("AI_HTTP2", "true").lower() == "true"
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_supported() -> bool:
+    """HTTP/2 需要安装 h2（httpx[http2]），未安装时回退到 HTTP/1.1"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=AI_HTTP2 and _http2_supported(),
+        limits=httpx.Limits(
+            max_connections=AI_MAX_CONNECTIONS,
+            max_keepalive_connections=AI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=AI_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(60.0, pool=AI_POOL_TIMEOUT),
+        # 不读取环境变量中的代理配置，直接连接
+        trust_env=False
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享客户端；未经 lifespan 启动时（如脚本中）按需创建"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def startup_http_client() -> None:
+    get_http_client()
+
+
+async def shutdown_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,146 @@
+"""
+小票图片预处理
+
+上传视觉模型前：按 EXIF 自动旋正、可选裁剪到小票区域、缩放到最长边上限、
+以指定质量重新编码为 JPEG（不写入 EXIF）。手机原图通常 4-8 MB，
+处理后一般只有几百 KB，上传和推理都更快。
+
+处理在进程池中执行，不阻塞事件循环；未安装 Pillow 或重新编码后反而更大时原样返回。
+"""
+import asyncio
+import functools
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple
+
+try:
+    from PIL import Image, ImageChops, ImageFilter, ImageOps
+except ImportError:  # Pillow 为可选依赖
+    Image = None
+
+RECEIPT_PREPROCESS = os.getenv("RECEIPT_PREPROCESS", "true").lower() == "true"
+RECEIPT_MAX_EDGE = int(os.getenv("RECEIPT_MAX_EDGE", "1600"))
+RECEIPT_JPEG_QUALITY = int(os.getenv("RECEIPT_JPEG_QUALITY", "80"))
+RECEIPT_AUTO_CROP = os.getenv("RECEIPT_AUTO_CROP", "false").lower() == "true"
+RECEIPT_PREPROCESS_WORKERS = int(os.getenv("RECEIPT_PREPROCESS_WORKERS", "2"))
+
+# 裁剪检测用缩略图的边长、与背景色的差异阈值，以及裁剪区域至少占原图的面积比例
+_CROP_DETECT_EDGE = 256
+_CROP_THRESHOLD = 40
+_CROP_MIN_AREA_RATIO = 0.2
+_CROP_MARGIN_RATIO = 0.02
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def preprocessing_available() -> bool:
+    return Image is not None and RECEIPT_PREPROCESS
+
+
+def _crop_to_receipt(img: "Image.Image") -> "Image.Image":
+    """以四角颜色估计背景，裁剪到与背景差异明显的区域
+
+    在模糊后的缩略图上检测，避免背景纹理和噪点干扰。
+    """
+    w, h = img.size
+    small = img.convert("L")
+    small.thumbnail((_CROP_DETECT_EDGE, _CROP_DETECT_EDGE))
+    small = small.filter(ImageFilter.BoxBlur(2))
+    sw, sh = small.size
+
+    corners = [small.getpixel((0, 0)), small.getpixel((sw - 1, 0)),
+               small.getpixel((0, sh - 1)), small.getpixel((sw - 1, sh - 1))]
+    background = sorted(corners)[len(corners) // 2]
+
+    diff = ImageChops.difference(small, Image.new("L", small.size, background))
+    bbox = diff.point(lambda p: 255 if p > _CROP_THRESHOLD else 0).getbbox()
+    if not bbox:
+        return img
+
+    scale_x, scale_y = w / sw, h / sh
+    left, top = int(bbox[0] * scale_x), int(bbox[1] * scale_y)
+    right, bottom = int(bbox[2] * scale_x), int(bbox[3] * scale_y)
+    if (right - left) * (bottom - top) < w * h * _CROP_MIN_AREA_RATIO:
+        # 区域过小，多半是误检，保留原图
+        return img
+
+    margin_x, margin_y = int(w * _CROP_MARGIN_RATIO), int(h * _CROP_MARGIN_RATIO)
+    return img.crop((
+        max(0, left - margin_x),
+        max(0, top - margin_y),
+        min(w, right + margin_x),
+        min(h, bottom + margin_y)
+    ))
+
+
+def preprocess_image(
+    data: bytes,
+    max_edge: int = RECEIPT_MAX_EDGE,
+    quality: int = RECEIPT_JPEG_QUALITY,
+    auto_crop: bool = RECEIPT_AUTO_CROP
+) -> Tuple[bytes, str]:
+    """同步处理一张图片，返回 (JPEG 字节, MIME 类型)；在子进程中执行"""
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if auto_crop:
+            img = _crop_to_receipt(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        output = io.BytesIO()
+        img.save(output, "JPEG", quality=quality, optimize=True)
+    return output.getvalue(), "image/jpeg"
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # 使用 spawn 启动子进程：fork 会复制事件循环、数据库连接池和其他线程持有的锁
+        _pool = ProcessPoolExecutor(
+            max_workers=max(1, RECEIPT_PREPROCESS_WORKERS),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_in_pool(func: Callable[..., Any], *args) -> Any:
+    """在进程池中执行；有子进程异常退出时进程池不再可用，关闭后由下次调用重新创建"""
+    global _pool
+    pool = get_pool()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, functools.partial(func, *args))
+    except BrokenProcessPool:
+        # 并发的调用可能已经换上了新的进程池，只重置出错的这一个
+        if _pool is pool:
+            print("Image process pool is broken, recreating it on next use")
+            pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        raise
+
+
+async def preprocess_receipt_image(data: bytes, mime_type: str) -> Tuple[bytes, str]:
+    """异步预处理，失败或不可用时返回原图"""
+    if not preprocessing_available():
+        return data, mime_type
+
+    try:
+        processed, processed_mime = await run_in_pool(preprocess_image, data)
+    except Exception as e:
+        print(f"Image preprocess error: {type(e).__name__}: {e}")
+        return data, mime_type
+    # 已经压缩过的小图重新编码后可能更大，此时上传原图
+    if len(processed) >= len(data):
+        return data, mime_type
+    return processed, processed_mime
@@ -0,0 +1,241 @@
+"""
+进程内异步任务队列
+
+耗时的 AI 调用（尤其是视觉识别）提交后立即返回任务 ID，由后台 worker 执行，
+客户端轮询 GET /api/ai/jobs/{id} 或通过 callback_url 接收结果。
+
+- 优先级通道：数值越小越先执行，语音解析排在图片识别之前，同一通道内先进先出
+- 背压：队列已满时拒绝提交（QueueFullError），由接口返回 503 和 Retry-After
+- 结果保存在 TTL 缓存中，过期后查询返回 404
+- 回调：callback_url 的主机须在 JOB_CALLBACK_HOSTS 白名单中，且解析出的地址不能是
+  内网、回环或链路本地地址；回调使用独立的 HTTP 客户端，在 worker 之外的后台任务中发送
+
+不依赖外部消息队列，任务只存在于当前进程内，重启或多 worker 部署时不共享。
+"""
+import asyncio
+import ipaddress
+import itertools
+import math
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .cache import TTLCache
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+JOB_CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))
+# 允许回调的主机名（逗号分隔），为空时不接受 callback_url
+JOB_CALLBACK_HOSTS = {
+    host.strip().lower() for host in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if host.strip()
+}
+# 同时进行中的回调数上限，超出的回调等待连接
+JOB_CALLBACK_CONNECTIONS = 10
+
+# 优先级通道
+LANE_VOICE = 0
+LANE_VISION = 2
+
+JobFunc = Callable[[], Awaitable[Any]]
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("job queue is full")
+        self.retry_after = retry_after
+
+
+def check_callback_url(url: str) -> None:
+    """提交任务时校验 callback_url 的协议和主机，不合法时抛出 ValueError"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url 必须是 http(s) 地址")
+    if parts.hostname.lower() not in JOB_CALLBACK_HOSTS:
+        raise ValueError("callback_url 的主机不在允许列表中")
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    return ip.is_global and not ip.is_multicast
+
+
+async def _resolve_public(host: str, port: int) -> None:
+    """发送前解析主机，任一地址为内网、回环、链路本地等非公网地址时抛出 ValueError"""
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port)
+    for info in infos:
+        if not _is_public_address(info[4][0]):
+            raise ValueError(f"callback host {host} resolves to non-public address {info[4][0]}")
+
+
+class Job:
+    def __init__(self, kind: str, priority: int, callback_url: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.callback_url = callback_url
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        maxsize: int = JOB_QUEUE_SIZE,
+        result_ttl: float = JOB_RESULT_TTL
+    ):
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._jobs = TTLCache(maxsize=max(1000, maxsize * 10), ttl=result_ttl)
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: list = []
+        # 进行中的回调任务，保留引用避免被回收，关闭时等待完成
+        self._callbacks: set = set()
+        self._callback_client: Optional[httpx.AsyncClient] = None
+        # 同一优先级内按提交顺序执行
+        self._sequence = itertools.count()
+        # 任务平均耗时（指数滑动平均），用于估算 Retry-After
+        self._avg_duration = 5.0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+        # 已完成任务的回调在超时时间内发完，超时的取消
+        if self._callbacks:
+            _, pending = await asyncio.wait(self._callbacks, timeout=JOB_CALLBACK_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._callback_client is not None:
+            await self._callback_client.aclose()
+            self._callback_client = None
+
+    def retry_after(self) -> int:
+        """估算队列腾出空位所需的秒数"""
+        pending = self._queue.qsize() if self._queue else 0
+        return max(1, math.ceil(pending * self._avg_duration / self.workers))
+
+    def submit(
+        self,
+        kind: str,
+        func: JobFunc,
+        priority: int,
+        callback_url: Optional[str] = None
+    ) -> Job:
+        """提交任务；未随应用启动时在首次提交时启动 worker"""
+        self.start()
+        job = Job(kind, priority, callback_url)
+        try:
+            self._queue.put_nowait((priority, next(self._sequence), job, func))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+        self._jobs.set(job.id, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job, func = await self._queue.get()
+            try:
+                await self._run(job, func)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job, func: JobFunc) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = await func()
+            job.status = "succeeded"
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) error: {type(e).__name__}: {e}")
+            job.status = "failed"
+            job.error = str(e) or type(e).__name__
+            self.failed += 1
+        job.finished_at = time.time()
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * (job.finished_at - job.started_at)
+        # 完成后重新写入，结果从完成时起保留 TTL
+        self._jobs.set(job.id, job)
+
+        if job.callback_url:
+            # 回调不占用 worker，慢的回调地址不影响后续任务
+            task = asyncio.create_task(self._send_callback(job))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+
+    def _get_callback_client(self) -> httpx.AsyncClient:
+        """回调使用独立的连接池，不占用 AI 请求的连接"""
+        if self._callback_client is None or self._callback_client.is_closed:
+            self._callback_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=JOB_CALLBACK_CONNECTIONS),
+                timeout=JOB_CALLBACK_TIMEOUT,
+                follow_redirects=False,
+                trust_env=False
+            )
+        return self._callback_client
+
+    async def _send_callback(self, job: Job) -> None:
+        try:
+            parts = urlsplit(job.callback_url)
+            await _resolve_public(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+            response = await self._get_callback_client().post(job.callback_url, json=job.to_dict())
+            if response.status_code >= 400:
+                print(f"Job callback {job.callback_url} returned {response.status_code}")
+        except Exception as e:
+            print(f"Job callback error: {type(e).__name__}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "maxsize": self.maxsize,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "callbacks": len(self._callbacks),
+            "avg_duration": round(self._avg_duration, 3)
+        }
+
+
+job_manager = JobManager()
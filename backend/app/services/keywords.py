@@ -0,0 +1,228 @@
+"""
+语音记账规则解析的关键词分类器
+
+所有关键词（含收入关键词）预编译为一个 Aho-Corasick 自动机，
+一次扫描文本即可找出全部命中，再按关键词权重为各分类计分。
+自定义词表可通过 VOICE_KEYWORDS_FILE 指定并热加载，格式：
+
+    {
+        "categories": {"餐饮": ["肯德基", "麦当劳"], "交通": {"加油": 3}},
+        "income": ["报销", "红包"]
+    }
+
+列表中的关键词权重默认为其长度（越长越具体），也可用对象形式显式指定。
+"""
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+DEFAULT_CATEGORY_KEYWORDS = {
+    '餐饮': ['吃', '餐', '饭', '午餐', '晚餐', '早餐', '外卖', '饮料', '咖啡', '奶茶'],
+    '交通': ['车', '打车', '地铁', '公交', '油费', '停车', '高铁', '机票', '滴滴'],
+    '购物': ['买', '购物', '超市', '淘宝', '京东', '商场', '衣服'],
+    '娱乐': ['电影', '游戏', '唱歌', 'KTV', '旅游', '玩'],
+    '住房': ['房租', '水电', '物业', '燃气'],
+    '医疗': ['医院', '药', '看病', '体检'],
+    '教育': ['书', '课程', '学费', '培训'],
+    '通讯': ['话费', '网费', '流量'],
+}
+DEFAULT_INCOME_KEYWORDS = ['收入', '工资', '奖金', '收到', '进账']
+
+DEFAULT_EXPENSE_CATEGORY = '其他'
+DEFAULT_INCOME_CATEGORY = '工资'
+
+# 自动机输出的标记：收入关键词不属于任何支出分类
+_INCOME = None
+
+KeywordSpec = Union[Iterable[str], Dict[str, float]]
+
+
+class AhoCorasick:
+    """多模式串匹配自动机，匹配耗时与文本长度和命中数成正比，与词表大小无关"""
+
+    def __init__(self, patterns: Dict[str, List[tuple]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[tuple]] = [[]]
+
+        for word, payloads in patterns.items():
+            self._insert(word, payloads)
+        self._build_fail_links()
+
+    def _insert(self, word: str, payloads: List[tuple]) -> None:
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].extend(payloads)
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                # 合并后缀节点的输出，命中长词时同时报告其包含的短词
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[tuple]:
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                yield from out[node]
+
+    @property
+    def size(self) -> int:
+        return len(self._goto)
+
+
+def _iter_weighted(keywords: KeywordSpec) -> Iterator[Tuple[str, float]]:
+    if isinstance(keywords, dict):
+        for kw, weight in keywords.items():
+            yield kw, float(weight)
+    else:
+        for kw in keywords:
+            yield kw, float(len(kw))
+
+
+def _check_spec(name: str, keywords) -> None:
+    """关键词须为字符串列表，或 {关键词: 权重} 对象"""
+    if isinstance(keywords, dict):
+        for kw, weight in keywords.items():
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+                raise ValueError(f"{name}.{kw} 的权重必须是数字")
+    elif isinstance(keywords, list):
+        if not all(isinstance(kw, str) for kw in keywords):
+            raise ValueError(f"{name} 的关键词必须是字符串")
+    else:
+        raise ValueError(f"{name} 必须是关键词数组或 {{关键词: 权重}} 对象")
+
+
+class KeywordClassifier:
+    def __init__(
+        self,
+        categories: Optional[Dict[str, KeywordSpec]] = None,
+        income: Optional[KeywordSpec] = None
+    ):
+        self._lock = threading.Lock()
+        # (自动机, 分类声明顺序)，整体替换以保证读取时一致
+        self._compiled: Tuple[AhoCorasick, Dict[str, int]]
+        self.keyword_count = 0
+        self.load(categories, income)
+
+    def load(
+        self,
+        categories: Optional[Dict[str, KeywordSpec]] = None,
+        income: Optional[KeywordSpec] = None,
+        merge_defaults: bool = True
+    ) -> None:
+        """编译新词表并原子替换，进行中的匹配仍使用旧自动机"""
+        all_categories: Dict[str, List[Tuple[str, float]]] = {}
+        income_keywords: List[Tuple[str, float]] = []
+
+        if merge_defaults:
+            for cat, kws in DEFAULT_CATEGORY_KEYWORDS.items():
+                all_categories.setdefault(cat, []).extend(_iter_weighted(kws))
+            income_keywords.extend(_iter_weighted(DEFAULT_INCOME_KEYWORDS))
+        for cat, kws in (categories or {}).items():
+            all_categories.setdefault(cat, []).extend(_iter_weighted(kws))
+        income_keywords.extend(_iter_weighted(income or []))
+
+        patterns: Dict[str, List[tuple]] = {}
+        for cat, kws in all_categories.items():
+            for kw, weight in kws:
+                if kw:
+                    patterns.setdefault(kw.lower(), []).append((cat, weight))
+        for kw, weight in income_keywords:
+            if kw:
+                patterns.setdefault(kw.lower(), []).append((_INCOME, weight))
+
+        automaton = AhoCorasick(patterns)
+        order = {cat: i for i, cat in enumerate(all_categories)}
+
+        with self._lock:
+            self._compiled = (automaton, order)
+            self.keyword_count = len(patterns)
+
+    def load_file(self, path: str) -> None:
+        """加载自定义词表文件，结构不符合上面的格式时抛出 ValueError"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("词表文件顶层必须是对象")
+        categories = data.get("categories")
+        if categories is not None:
+            if not isinstance(categories, dict):
+                raise ValueError("categories 必须是 {分类: 关键词} 对象")
+            for cat, kws in categories.items():
+                _check_spec(f"categories.{cat}", kws)
+        income = data.get("income")
+        if income is not None:
+            _check_spec("income", income)
+        self.load(categories, income)
+
+    def score(self, text: str) -> Tuple[Dict[str, float], float]:
+        """返回 (各支出分类得分, 收入关键词得分)"""
+        return self._score(self._compiled[0], text)
+
+    @staticmethod
+    def _score(automaton: AhoCorasick, text: str) -> Tuple[Dict[str, float], float]:
+        scores: Dict[str, float] = {}
+        income_score = 0.0
+        for cat, weight in automaton.iter_matches(text.lower()):
+            if cat is _INCOME:
+                income_score += weight
+            else:
+                scores[cat] = scores.get(cat, 0.0) + weight
+        return scores, income_score
+
+    def classify(self, text: str) -> Tuple[str, str]:
+        """返回 (交易类型, 分类)；得分相同时按分类声明顺序优先"""
+        automaton, order = self._compiled
+        scores, income_score = self._score(automaton, text)
+        transaction_type = "income" if income_score > 0 else "expense"
+
+        if scores:
+            category = max(scores, key=lambda c: (scores[c], -order.get(c, len(order))))
+        elif transaction_type == "income":
+            category = DEFAULT_INCOME_CATEGORY
+        else:
+            category = DEFAULT_EXPENSE_CATEGORY
+        return transaction_type, category
+
+
+def _create_default_classifier() -> KeywordClassifier:
+    classifier = KeywordClassifier()
+    path = os.getenv("VOICE_KEYWORDS_FILE")
+    if path and os.path.exists(path):
+        classifier.load_file(path)
+    return classifier
+
+
+keyword_classifier = _create_default_classifier()
+
+
+def reload_keywords(path: Optional[str] = None) -> int:
+    """重新加载自定义词表文件，返回关键词总数"""
+    path = path or os.getenv("VOICE_KEYWORDS_FILE")
+    if not path:
+        keyword_classifier.load()
+    else:
+        keyword_classifier.load_file(path)
+    return keyword_classifier.keyword_count
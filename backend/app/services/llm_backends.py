@@ -0,0 +1,464 @@
+"""
+大模型后端抽象
+
+- OpenAICompatibleBackend：云端 OpenAI 兼容接口（SiliconFlow 等），Bearer 鉴权
+- OllamaBackend：本地 Ollama（/api/chat），请求携带 keep_alive 让模型常驻内存
+- LlamaCppBackend：本地 llama.cpp server（OpenAI 兼容的 /v1/chat/completions）
+
+LLMRouter 按任务选择后端：语音解析这类短提示词优先交给本地小模型，
+对话和图片识别优先使用云端；首选后端失败时依次尝试下一个，全部失败返回 None，
+由调用方回退到规则解析。本地后端由后台任务定期探活，恢复可用时自动预热。
+
+消息格式统一使用 OpenAI 的 messages 结构，各后端负责转换。
+"""
+import asyncio
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from .http_client import get_http_client, AI_POOL_TIMEOUT
+from .resilience import (
+    CircuitBreaker,
+    ai_breaker,
+    request_with_retries,
+    RETRYABLE_STATUS,
+    AI_CHAT_DEADLINE
+)
+
+USE_OLLAMA = os.getenv("USE_OLLAMA", "false").lower() == "true"
+# 本地后端类型：ollama / llamacpp，留空表示不使用本地模型
+LOCAL_LLM_BACKEND = os.getenv("LOCAL_LLM_BACKEND", "ollama" if USE_OLLAMA else "").lower()
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:7b")
+OLLAMA_VISION_MODEL = os.getenv("OLLAMA_VISION_MODEL", "")
+# 模型在最后一次请求后常驻内存的时长，-1 表示一直常驻
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+LLAMACPP_BASE_URL = os.getenv("LLAMACPP_BASE_URL", "http://localhost:8080")
+LLAMACPP_MODEL = os.getenv("LLAMACPP_MODEL", "local")
+LLAMACPP_API_KEY = os.getenv("LLAMACPP_API_KEY", "")
+
+# 提示词不超过该字符数的解析任务优先交给本地模型
+LOCAL_ROUTE_MAX_CHARS = int(os.getenv("LOCAL_ROUTE_MAX_CHARS", "600"))
+LOCAL_HEALTH_INTERVAL = float(os.getenv("LOCAL_HEALTH_INTERVAL", "30"))
+LOCAL_HEALTH_TIMEOUT = float(os.getenv("LOCAL_HEALTH_TIMEOUT", "3"))
+LOCAL_WARMUP_TIMEOUT = float(os.getenv("LOCAL_WARMUP_TIMEOUT", "120"))
+
+TASK_PARSE = "parse"
+TASK_CHAT = "chat"
+TASK_VISION = "vision"
+
+_DATA_URL = re.compile(r"^data:[^;]+;base64,(.*)$", re.DOTALL)
+
+
+class LLMBackend(ABC):
+    name = "base"
+    local = False
+
+    def __init__(self, base_url: str, model: str, vision_model: str = "", breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.vision_model = vision_model
+        self.breaker = breaker or CircuitBreaker()
+        # 远端服务默认视为可用，本地服务以探活结果为准
+        self.available = not self.local
+
+    @property
+    def supports_vision(self) -> bool:
+        return bool(self.vision_model)
+
+    @abstractmethod
+    async def complete(
+        self,
+        messages: List[dict],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        deadline: float = AI_CHAT_DEADLINE,
+        vision: bool = False
+    ) -> Optional[str]:
+        """返回回复内容，失败时返回 None；所有重试都在 deadline 秒内完成"""
+
+    @abstractmethod
+    def stream(
+        self,
+        messages: List[dict],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        deadline: float = AI_CHAT_DEADLINE
+    ) -> AsyncIterator[str]:
+        """逐段产出回复内容"""
+
+    async def health(self) -> bool:
+        return True
+
+    async def warmup(self) -> None:
+        pass
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "model": self.model,
+            "vision_model": self.vision_model,
+            "available": self.available,
+            "circuit_breaker": self.breaker.stats()
+        }
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    name = "openai"
+    chat_path = "/chat/completions"
+
+    def __init__(self, base_url: str, model: str, api_key: str = "", vision_model: str = "",
+                 breaker: Optional[CircuitBreaker] = None):
+        super().__init__(base_url, model, vision_model, breaker)
+        self.api_key = api_key
+
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _payload(self, messages, temperature, max_tokens, vision, stream=False) -> dict:
+        payload = {
+            "model": self.vision_model if vision else self.model,
+            "messages": messages,
+            "temperature": temperature
+        }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def complete(self, messages, temperature=0.7, max_tokens=None, deadline=AI_CHAT_DEADLINE, vision=False):
+        result = await request_with_retries(
+            self.base_url + self.chat_path,
+            self._payload(messages, temperature, max_tokens, vision),
+            self.breaker,
+            headers=self._headers(),
+            deadline=deadline
+        )
+        if result:
+            try:
+                return result["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError) as e:
+                print(f"Parse error: {e}")
+        return None
+
+    async def stream(self, messages, temperature=0.7, max_tokens=None, deadline=AI_CHAT_DEADLINE):
+        """流式输出（SSE）不做重试；超时作用于建立连接和每次读取"""
+        if not self.breaker.allow_request():
+            print(f"AI API skipped: circuit breaker is open ({self.name})")
+            return
+
+        try:
+            async with get_http_client().stream(
+                "POST",
+                self.base_url + self.chat_path,
+                headers=self._headers(),
+                json=self._payload(messages, temperature, max_tokens, vision=False, stream=True),
+                timeout=httpx.Timeout(deadline, pool=AI_POOL_TIMEOUT)
+            ) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    print(f"AI API error: {response.status_code} - {body[:500].decode(errors='replace')}")
+                    if response.status_code in RETRYABLE_STATUS:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    return
+                self.breaker.record_success()
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    except (ValueError, KeyError, IndexError) as e:
+                        print(f"Parse error: {e}")
+                        continue
+                    if delta:
+                        yield delta
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+
+
+class LlamaCppBackend(OpenAICompatibleBackend):
+    """llama.cpp server：模型在进程启动时加载并一直常驻，预热只需跑一次极短的推理"""
+    name = "llamacpp"
+    local = True
+    chat_path = "/v1/chat/completions"
+
+    async def health(self) -> bool:
+        try:
+            response = await get_http_client().get(f"{self.base_url}/health", timeout=LOCAL_HEALTH_TIMEOUT)
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    async def warmup(self) -> None:
+        await self.complete([{"role": "user", "content": "你好"}], max_tokens=1, deadline=LOCAL_WARMUP_TIMEOUT)
+
+
+class OllamaBackend(LLMBackend):
+    name = "ollama"
+    local = True
+
+    def __init__(self, base_url: str, model: str, vision_model: str = "", keep_alive: str = OLLAMA_KEEP_ALIVE,
+                 breaker: Optional[CircuitBreaker] = None):
+        super().__init__(base_url, model, vision_model, breaker)
+        self.keep_alive = keep_alive
+
+    @staticmethod
+    def _convert_messages(messages: List[dict]) -> List[dict]:
+        """OpenAI 多段内容（文本 + data URL 图片）转换为 Ollama 的 content + images"""
+        converted = []
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, list):
+                converted.append({"role": message.get("role", "user"), "content": content or ""})
+                continue
+            texts, images = [], []
+            for part in content:
+                if part.get("type") == "text":
+                    texts.append(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    match = _DATA_URL.match(part.get("image_url", {}).get("url", ""))
+                    if match:
+                        images.append(match.group(1))
+            item = {"role": message.get("role", "user"), "content": "\n".join(texts)}
+            if images:
+                item["images"] = images
+            converted.append(item)
+        return converted
+
+    def _payload(self, messages, temperature, max_tokens, vision, stream=False) -> dict:
+        options = {"temperature": temperature}
+        if max_tokens:
+            options["num_predict"] = max_tokens
+        return {
+            "model": self.vision_model if vision else self.model,
+            "messages": self._convert_messages(messages),
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options
+        }
+
+    async def complete(self, messages, temperature=0.7, max_tokens=None, deadline=AI_CHAT_DEADLINE, vision=False):
+        result = await request_with_retries(
+            f"{self.base_url}/api/chat",
+            self._payload(messages, temperature, max_tokens, vision),
+            self.breaker,
+            deadline=deadline
+        )
+        if result:
+            try:
+                return result["message"]["content"]
+            except (KeyError, TypeError) as e:
+                print(f"Parse error: {e}")
+        return None
+
+    async def stream(self, messages, temperature=0.7, max_tokens=None, deadline=AI_CHAT_DEADLINE):
+        """Ollama 流式输出为逐行 JSON"""
+        if not self.breaker.allow_request():
+            print(f"AI API skipped: circuit breaker is open ({self.name})")
+            return
+
+        try:
+            async with get_http_client().stream(
+                "POST",
+                f"{self.base_url}/api/chat",
+                json=self._payload(messages, temperature, max_tokens, vision=False, stream=True),
+                timeout=httpx.Timeout(deadline, pool=AI_POOL_TIMEOUT)
+            ) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    print(f"Ollama error: {response.status_code} - {body[:500].decode(errors='replace')}")
+                    if response.status_code in RETRYABLE_STATUS:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    return
+                self.breaker.record_success()
+
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except ValueError as e:
+                        print(f"Parse error: {e}")
+                        continue
+                    delta = (chunk.get("message") or {}).get("content")
+                    if delta:
+                        yield delta
+                    if chunk.get("done"):
+                        break
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+
+    async def health(self) -> bool:
+        """服务可达且已拉取所需模型"""
+        try:
+            response = await get_http_client().get(f"{self.base_url}/api/tags", timeout=LOCAL_HEALTH_TIMEOUT)
+            if response.status_code != 200:
+                return False
+            names = {m.get("name", "") for m in response.json().get("models", [])}
+        except (httpx.HTTPError, ValueError):
+            return False
+        names |= {n[:-len(":latest")] for n in names if n.endswith(":latest")}
+        if self.vision_model and self.vision_model not in names:
+            print(f"Ollama vision model {self.vision_model} not found")
+        return self.model in names
+
+    async def warmup(self) -> None:
+        """不带提示词的 generate 请求只加载模型，并按 keep_alive 常驻"""
+        try:
+            await get_http_client().post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "keep_alive": self.keep_alive},
+                timeout=LOCAL_WARMUP_TIMEOUT
+            )
+        except httpx.HTTPError as e:
+            print(f"Ollama warmup error: {type(e).__name__}: {e}")
+
+    def describe(self) -> dict:
+        return {**super().describe(), "keep_alive": self.keep_alive}
+
+
+def create_local_backend() -> Optional[LLMBackend]:
+    if LOCAL_LLM_BACKEND == "ollama":
+        return OllamaBackend(OLLAMA_BASE_URL, OLLAMA_MODEL, OLLAMA_VISION_MODEL)
+    if LOCAL_LLM_BACKEND == "llamacpp":
+        return LlamaCppBackend(LLAMACPP_BASE_URL, LLAMACPP_MODEL, api_key=LLAMACPP_API_KEY)
+    if LOCAL_LLM_BACKEND:
+        print(f"Unknown LOCAL_LLM_BACKEND: {LOCAL_LLM_BACKEND}")
+    return None
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        cloud: Optional[LLMBackend] = None,
+        local: Optional[LLMBackend] = None,
+        route_max_chars: int = LOCAL_ROUTE_MAX_CHARS
+    ):
+        self.cloud = cloud
+        self.local = local
+        self.route_max_chars = route_max_chars
+        self._health_task: Optional[asyncio.Task] = None
+
+    def candidates(self, task: str, prompt_chars: int = 0) -> List[LLMBackend]:
+        """按优先顺序返回可用于该任务的后端"""
+        local = self.local if self.local is not None and self.local.available else None
+        cloud = self.cloud
+
+        if task == TASK_VISION:
+            order = [cloud, local]
+            return [b for b in order if b is not None and b.supports_vision]
+        if task == TASK_PARSE and prompt_chars <= self.route_max_chars:
+            order = [local, cloud]
+        else:
+            order = [cloud, local]
+        return [b for b in order if b is not None]
+
+    def enabled(self, task: str) -> bool:
+        return bool(self.candidates(task))
+
+    async def complete(
+        self,
+        task: str,
+        messages: List[dict],
+        deadline: float = AI_CHAT_DEADLINE,
+        **kwargs
+    ) -> Optional[str]:
+        """deadline 是整个调用的时间预算：回退到下一个后端时只使用剩余的时间"""
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + deadline
+        prompt_chars = sum(len(m["content"]) for m in messages if isinstance(m.get("content"), str))
+        for backend in self.candidates(task, prompt_chars):
+            remaining = expires_at - loop.time()
+            if remaining <= 0:
+                print(f"AI deadline exceeded before trying {backend.name} ({task})")
+                break
+            print(f"Calling {backend.name} ({task}): {backend.base_url} with model "
+                  f"{backend.vision_model if task == TASK_VISION else backend.model}")
+            content = await backend.complete(
+                messages, vision=task == TASK_VISION, deadline=remaining, **kwargs
+            )
+            if content:
+                return content
+        return None
+
+    async def stream(
+        self,
+        task: str,
+        messages: List[dict],
+        deadline: float = AI_CHAT_DEADLINE,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """首选后端没有产出任何内容时用剩余的时间尝试下一个；已开始输出后不再切换"""
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + deadline
+        for backend in self.candidates(task):
+            remaining = expires_at - loop.time()
+            if remaining <= 0:
+                break
+            produced = False
+            try:
+                async for delta in backend.stream(messages, deadline=remaining, **kwargs):
+                    produced = True
+                    yield delta
+            except httpx.HTTPError as e:
+                if produced:
+                    raise
+                print(f"{backend.name} stream error: {type(e).__name__}: {e}")
+            if produced:
+                return
+
+    async def _probe_local(self) -> None:
+        was_available = self.local.available
+        self.local.available = await self.local.health()
+        if self.local.available and not was_available:
+            print(f"Local LLM ({self.local.name}) is available, warming up {self.local.model}")
+            await self.local.warmup()
+        elif was_available and not self.local.available:
+            print(f"Local LLM ({self.local.name}) is unavailable")
+
+    async def _health_loop(self) -> None:
+        while True:
+            try:
+                await self._probe_local()
+            except Exception as e:
+                print(f"Local LLM health check error: {type(e).__name__}: {e}")
+            await asyncio.sleep(LOCAL_HEALTH_INTERVAL)
+
+    def start(self) -> None:
+        """启动本地后端的探活和预热（后台执行，不阻塞应用启动）"""
+        if self.local is not None and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+
+def create_llm_router(api_key: str, api_base: str, model: str, vision_model: str) -> LLMRouter:
+    cloud = None
+    if api_key:
+        cloud = OpenAICompatibleBackend(api_base, model, api_key, vision_model, breaker=ai_breaker)
+    return LLMRouter(cloud=cloud, local=create_local_backend())
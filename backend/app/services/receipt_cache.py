@@ -0,0 +1,239 @@
+"""
+小票识别结果缓存
+
+同一张图片重复上传（超时重试、连点）时直接返回上次的识别结果：
+按原始字节的 SHA-256 精确匹配；设置 RECEIPT_PHASH_DISTANCE 后还按感知哈希（dHash）
+的汉明距离匹配近似重复（如重新截图、压缩率不同）。版式相同的不同小票、支付截图的
+dHash 也很接近，因此近似匹配默认关闭，命中时调用方需把结果标记为近似结果。
+缓存按条目数和字节数双重限制容量（LRU 淘汰），设置 RECEIPT_CACHE_DB 时同时写入 SQLite，
+重启后仍然有效。写入只在内存中记下待落盘的语句，由 put 在线程中统一提交，不阻塞事件循环；
+命中时的访问时间同样先记在内存中，随下次写入一并落盘。
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖
+    Image = None
+
+RECEIPT_CACHE_SIZE = int(os.getenv("RECEIPT_CACHE_SIZE", "1000"))
+RECEIPT_CACHE_MAX_BYTES = int(os.getenv("RECEIPT_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+RECEIPT_CACHE_DB = os.getenv("RECEIPT_CACHE_DB", "")
+# 感知哈希的最大汉明距离，默认 -1 关闭近似匹配
+RECEIPT_PHASH_DISTANCE = int(os.getenv("RECEIPT_PHASH_DISTANCE", "-1"))
+# 每条缓存除结果 JSON 以外的固定开销估算（键、哈希、容器）
+_ENTRY_OVERHEAD = 200
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(data: bytes) -> Optional[int]:
+    """计算 64 位 dHash；图片无法解码或未安装 Pillow 时返回 None"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # JPEG 可按 DCT 缩放解码，大图也只需几毫秒
+            img.draft("L", (64, 64))
+            pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+async def compute_perceptual_hash(data: bytes) -> Optional[int]:
+    """在图片预处理进程池中计算感知哈希"""
+    if Image is None or RECEIPT_PHASH_DISTANCE < 0:
+        return None
+    from .image_preprocess import run_in_pool
+
+    try:
+        return await run_in_pool(perceptual_hash, data)
+    except Exception as e:
+        print(f"Perceptual hash error: {type(e).__name__}: {e}")
+        return None
+
+
+class ReceiptCache:
+    def __init__(
+        self,
+        max_entries: int = RECEIPT_CACHE_SIZE,
+        max_bytes: int = RECEIPT_CACHE_MAX_BYTES,
+        db_path: str = RECEIPT_CACHE_DB,
+        max_distance: int = RECEIPT_PHASH_DISTANCE
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        # sha256 -> (结果, 感知哈希, 字节数)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        # 尚未落盘的写入（按发生顺序）和访问时间：sha256 -> used_at
+        self._pending = []
+        self._touched = {}
+        self._lock = threading.Lock()
+        # 保证各批写入按取出的顺序提交
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS receipt_cache ("
+            "sha256 TEXT PRIMARY KEY, phash INTEGER, result TEXT NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+        rows = self._db.execute(
+            "SELECT sha256, phash, result FROM receipt_cache ORDER BY used_at DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        # 按最近使用时间从旧到新插入，保持 LRU 顺序
+        for sha, phash, result in reversed(rows):
+            self._store(sha, json.loads(result), _from_signed(phash), persist=False)
+
+    def _persist(self, sql: str, params: tuple) -> None:
+        """记下一条待落盘的写入，由 _flush 提交"""
+        if self._db is not None:
+            self._pending.append((sql, params))
+
+    def _flush(self) -> None:
+        """把积攒的写入和访问时间在同一次提交中落盘；同步执行，应在线程中调用"""
+        if self._db is None:
+            return
+        with self._db_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                touched, self._touched = self._touched, {}
+            if not pending and not touched:
+                return
+            try:
+                for sql, params in pending:
+                    self._db.execute(sql, params)
+                if touched:
+                    self._db.executemany(
+                        "UPDATE receipt_cache SET used_at = ? WHERE sha256 = ?",
+                        [(used_at, sha) for sha, used_at in touched.items()]
+                    )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Receipt cache persist error: {e}")
+
+    def _store(self, sha: str, result: dict, phash: Optional[int], persist: bool = True) -> None:
+        encoded = json.dumps(result, ensure_ascii=False)
+        size = len(encoded.encode("utf-8")) + _ENTRY_OVERHEAD
+
+        old = self._entries.pop(sha, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[sha] = (result, phash, size)
+        self._bytes += size
+        if persist:
+            self._persist(
+                "INSERT OR REPLACE INTO receipt_cache (sha256, phash, result, used_at) VALUES (?, ?, ?, ?)",
+                (sha, _to_signed(phash), encoded, time.time())
+            )
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            evicted_sha, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._touched.pop(evicted_sha, None)
+            self._persist("DELETE FROM receipt_cache WHERE sha256 = ?", (evicted_sha,))
+
+    def _touch(self, sha: str) -> dict:
+        self._entries.move_to_end(sha)
+        if self._db is not None:
+            # 命中发生在事件循环上，不在命中时提交，随下次写入落盘
+            self._touched[sha] = time.time()
+        return self._entries[sha][0]
+
+    def get(self, sha: str) -> Optional[dict]:
+        """按内容哈希精确查找"""
+        with self._lock:
+            if sha in self._entries:
+                self.hits += 1
+                return self._touch(sha)
+            return None
+
+    def get_similar(self, phash: Optional[int]) -> Optional[dict]:
+        """按感知哈希查找汉明距离最小且不超过阈值的条目
+
+        返回的是另一张图片的识别结果，可能与本图不符，调用方应标记为近似结果且不以本图的哈希缓存
+        """
+        with self._lock:
+            if phash is not None and self.max_distance >= 0:
+                best, best_distance = None, self.max_distance + 1
+                for sha, (_, other, _) in self._entries.items():
+                    if other is None:
+                        continue
+                    distance = (phash ^ other).bit_count()
+                    if distance < best_distance:
+                        best, best_distance = sha, distance
+                if best is not None:
+                    self.near_hits += 1
+                    return self._touch(best)
+            self.misses += 1
+            return None
+
+    async def put(self, sha: str, result: dict, phash: Optional[int] = None) -> None:
+        """先更新内存，再在线程中提交 SQLite 写入"""
+        with self._lock:
+            self._store(sha, result, phash)
+        if self._db is not None:
+            await asyncio.to_thread(self._flush)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.near_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.near_hits) / total, 4) if total else 0.0,
+                "persistent": self._db is not None
+            }
+
+
+def _to_signed(value: Optional[int]) -> Optional[int]:
+    """SQLite INTEGER 为有符号 64 位"""
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _from_signed(value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
+
+
+receipt_cache = ReceiptCache()
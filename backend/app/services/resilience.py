@@ -0,0 +1,190 @@
+"""
+AI 服务调用的容错：熔断器、带抖动的指数退避重试、按接口的时间预算
+
+- 熔断器：连续失败达到阈值后进入 open 状态，期间直接拒绝调用，接口立即回退到
+  本地规则；冷却时间结束后进入 half-open，只放行一个探测请求，成功则恢复，
+  失败则重新打开
+- 重试：仅针对 429/5xx 和连接错误，延迟为 [0, min(上限, 基数 * 2^n)] 内的随机值
+  （full jitter），服务端返回 Retry-After 时至少等待该时长
+- 时间预算：每个接口一个总截止时间，重试和等待都不能超出
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from .http_client import get_http_client, AI_POOL_TIMEOUT
+
+AI_RETRY_ATTEMPTS = int(os.getenv("AI_RETRY_ATTEMPTS", "2"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "4"))
+
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_RESET = float(os.getenv("AI_BREAKER_RESET", "30"))
+
+# 各接口的总时间预算（秒）
+AI_VOICE_DEADLINE = float(os.getenv("AI_VOICE_DEADLINE", "10"))
+AI_CHAT_DEADLINE = float(os.getenv("AI_CHAT_DEADLINE", "30"))
+AI_VISION_DEADLINE = float(os.getenv("AI_VISION_DEADLINE", "60"))
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = AI_BREAKER_FAILURES, reset_timeout: float = AI_BREAKER_RESET):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        """是否放行本次调用；half-open 时同一时刻只放行一个探测请求
+
+        探测请求被取消而没有回报结果时，超过冷却时间后允许新的探测。
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            now = time.monotonic()
+            if state == HALF_OPEN and (not self._probing or now - self._probe_started >= self.reset_timeout):
+                self._probing = True
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected
+            }
+
+
+def backoff_delay(
+    attempt: int,
+    retry_after: Optional[float] = None,
+    base: float = AI_RETRY_BASE_DELAY,
+    cap: float = AI_RETRY_MAX_DELAY
+) -> float:
+    """第 attempt 次重试（从 0 开始）前的等待秒数"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """只支持秒数形式的 Retry-After"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+async def request_with_retries(
+    url: str,
+    json_data: dict,
+    breaker: CircuitBreaker,
+    headers: Optional[dict] = None,
+    deadline: float = AI_CHAT_DEADLINE
+) -> Optional[dict]:
+    """POST JSON 并返回响应 JSON - 复用共享连接池
+
+    熔断器打开时立即返回 None；429/5xx 和连接错误按指数退避重试，
+    所有尝试和等待都不超过 deadline 秒。
+    """
+    if not breaker.allow_request():
+        print(f"AI API skipped: circuit breaker is open ({url})")
+        return None
+
+    loop = asyncio.get_running_loop()
+    expires_at = loop.time() + deadline
+    for attempt in range(AI_RETRY_ATTEMPTS + 1):
+        remaining = expires_at - loop.time()
+        if remaining <= 0:
+            break
+
+        retry_after = None
+        try:
+            response = await get_http_client().post(
+                url,
+                headers=headers,
+                json=json_data,
+                timeout=httpx.Timeout(remaining, pool=min(AI_POOL_TIMEOUT, remaining))
+            )
+            if response.status_code == 200:
+                result = response.json()
+                breaker.record_success()
+                return result
+            print(f"AI API error: {response.status_code} - {response.text[:500]}")
+            if response.status_code not in RETRYABLE_STATUS:
+                # 请求本身有误（如密钥无效），服务是可用的，不计入熔断
+                breaker.record_success()
+                return None
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        except httpx.TimeoutException as e:
+            # 超时已耗尽时间预算，不再重试
+            print(f"AI API error: {type(e).__name__}: {e}")
+            break
+        except Exception as e:
+            print(f"AI API error: {type(e).__name__}: {e}")
+
+        if attempt < AI_RETRY_ATTEMPTS:
+            delay = backoff_delay(attempt, retry_after)
+            if loop.time() + delay >= expires_at:
+                break
+            await asyncio.sleep(delay)
+
+    breaker.record_failure()
+    return None
+
+
+# 云端 AI 接口共用同一个上游服务，因此共用一个熔断器
+ai_breaker = CircuitBreaker()
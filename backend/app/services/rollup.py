@@ -0,0 +1,152 @@
+"""
+按日预聚合表 daily_rollup 的维护
+
+交易写入接口在提交前调用 apply_transaction（异步会话），使汇总与交易处于同一事务；
+rebuild_rollup / check_rollup（同步会话）用于历史数据回填和一致性校验：
+
+    python rollup.py rebuild [--user-id 1]
+    python rollup.py check [--user-id 1]
+"""
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import DailyRollup, Transaction
+from app.money import from_cents
+
+from .categories import UNCATEGORIZED_ID
+
+
+def _value(v):
+    return v.value if hasattr(v, 'value') else v
+
+
+def _upsert_statement(dialect: str, values: dict):
+    """构造累加式 upsert 语句（PostgreSQL/SQLite 均支持 ON CONFLICT）"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    table = DailyRollup.__table__
+    stmt = dialect_insert(table).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.date, table.c.type, table.c.category_id],
+        set_={
+            "amount_cents": table.c.amount_cents + stmt.excluded.amount_cents,
+            "count": table.c.count + stmt.excluded.count,
+        }
+    )
+
+
+async def apply_delta(
+    db: AsyncSession,
+    user_id: int,
+    day: date,
+    type,
+    category_id: Optional[int],
+    amount_cents: int,
+    count: int
+) -> None:
+    """把一笔增量（金额单位为分）累加到对应的汇总行，计数归零时删除该行"""
+    values = {
+        "user_id": user_id,
+        "date": day,
+        "type": _value(type),
+        "category_id": category_id or UNCATEGORIZED_ID,
+        "amount_cents": amount_cents,
+        "count": count,
+    }
+    await db.execute(_upsert_statement(db.bind.dialect.name, values))
+
+    if count < 0:
+        await db.execute(delete(DailyRollup).where(
+            DailyRollup.user_id == values["user_id"],
+            DailyRollup.date == values["date"],
+            DailyRollup.type == values["type"],
+            DailyRollup.category_id == values["category_id"],
+            DailyRollup.count <= 0
+        ))
+
+
+async def apply_transaction(db: AsyncSession, transaction: Transaction, sign: int = 1) -> None:
+    """计入(sign=1)或扣除(sign=-1)一笔交易对汇总表的贡献"""
+    await apply_delta(
+        db,
+        user_id=transaction.user_id,
+        day=transaction.date,
+        type=transaction.type,
+        category_id=transaction.category_id,
+        amount_cents=sign * (transaction.amount_cents or 0),
+        count=sign
+    )
+
+
+def _aggregate_transactions(user_id: Optional[int] = None):
+    stmt = select(
+        Transaction.user_id,
+        Transaction.date,
+        Transaction.type,
+        func.coalesce(Transaction.category_id, UNCATEGORIZED_ID).label("category_id"),
+        func.coalesce(func.sum(Transaction.amount_cents), 0).label("amount_cents"),
+        func.count(Transaction.id).label("count")
+    ).group_by(
+        Transaction.user_id,
+        Transaction.date,
+        Transaction.type,
+        func.coalesce(Transaction.category_id, UNCATEGORIZED_ID)
+    )
+    if user_id is not None:
+        stmt = stmt.where(Transaction.user_id == user_id)
+    return stmt
+
+
+def rebuild_rollup(db: Session, user_id: Optional[int] = None) -> int:
+    """从交易表全量重建汇总（不提交事务），返回写入的汇总行数"""
+    clear = delete(DailyRollup)
+    if user_id is not None:
+        clear = clear.where(DailyRollup.user_id == user_id)
+    db.execute(clear)
+
+    db.execute(insert(DailyRollup).from_select(
+        ["user_id", "date", "type", "category_id", "amount_cents", "count"],
+        _aggregate_transactions(user_id)
+    ))
+
+    count_query = db.query(func.count()).select_from(DailyRollup)
+    if user_id is not None:
+        count_query = count_query.filter(DailyRollup.user_id == user_id)
+    return count_query.scalar() or 0
+
+
+def check_rollup(db: Session, user_id: Optional[int] = None) -> List[dict]:
+    """对比汇总表与交易表的实时聚合，返回不一致的条目"""
+    def key(row):
+        return (row.user_id, row.date, _value(row.type), row.category_id)
+
+    expected = {key(r): r for r in db.execute(_aggregate_transactions(user_id))}
+
+    rollup_query = db.query(DailyRollup)
+    if user_id is not None:
+        rollup_query = rollup_query.filter(DailyRollup.user_id == user_id)
+    actual = {key(r): r for r in rollup_query}
+
+    mismatches = []
+    for k in sorted(set(expected) | set(actual), key=str):
+        e, a = expected.get(k), actual.get(k)
+        # 金额为整数分，可精确比较
+        e_cents, e_count = (int(e.amount_cents), e.count) if e else (0, 0)
+        a_cents, a_count = (int(a.amount_cents), a.count) if a else (0, 0)
+        if e_count != a_count or e_cents != a_cents:
+            mismatches.append({
+                "user_id": k[0],
+                "date": k[1].isoformat(),
+                "type": k[2],
+                "category_id": k[3],
+                "expected": {"amount": str(from_cents(e_cents)), "count": e_count},
+                "actual": {"amount": str(from_cents(a_cents)), "count": a_count},
+            })
+    return mismatches
@@ -0,0 +1,52 @@
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import DailyRollup
+from app.money import from_cents
+
+
+class TransactionTotals(NamedTuple):
+    income: Decimal
+    expense: Decimal
+    count: int
+
+    @property
+    def balance(self) -> Decimal:
+        return self.income - self.expense
+
+
+async def get_transaction_totals(
+    db: AsyncSession,
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> TransactionTotals:
+    """一次查询同时统计收入、支出和交易数量（基于按日汇总表的条件聚合）
+
+    金额以整数分求和，结果换算为 Decimal，不存在浮点累加误差。
+    """
+    # 使用字符串值比较以确保PostgreSQL兼容性
+    income_sum = func.sum(case((DailyRollup.type == 'income', DailyRollup.amount_cents), else_=0))
+    expense_sum = func.sum(case((DailyRollup.type == 'expense', DailyRollup.amount_cents), else_=0))
+
+    stmt = select(
+        func.coalesce(income_sum, 0).label('income'),
+        func.coalesce(expense_sum, 0).label('expense'),
+        func.coalesce(func.sum(DailyRollup.count), 0).label('count')
+    ).where(DailyRollup.user_id == user_id)
+
+    if start_date:
+        stmt = stmt.where(DailyRollup.date >= start_date)
+    if end_date:
+        stmt = stmt.where(DailyRollup.date <= end_date)
+
+    row = (await db.execute(stmt)).one()
+    return TransactionTotals(
+        income=from_cents(row.income),
+        expense=from_cents(row.expense),
+        count=row.count or 0
+    )
@@ -0,0 +1,47 @@
+"""
+统计接口的响应缓存
+
+每个条目按 (用户, 年月) 打标签，交易写入提交后只失效受影响月份的条目；
+不限月份的统计（如 /api/user/stats）使用 ALL_MONTHS 标签，任何写入都会失效。
+缓存未命中时先取标签代数再查询，set 时带上代数，避免并发写入后写回旧结果；
+缓存值按深拷贝存取，调用方修改响应不会影响缓存。
+缓存按进程独立，标签失效只作用于本进程；缓存键因此包含用户的 data_version，
+其他进程提交写入后版本号变化，本进程的旧条目不再命中，响应与 ETag 保持一致。
+"""
+import os
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+from .cache import TTLCache
+
+ALL_MONTHS = "*"
+
+stats_cache = TTLCache(
+    maxsize=int(os.getenv("STATS_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("STATS_CACHE_TTL", "300")),
+    copy_values=True
+)
+
+
+def months_between(start_date: date, end_date: date) -> List[Tuple[int, int]]:
+    """返回日期区间覆盖的 (年, 月) 列表"""
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def month_tags(user_id: int, months: Optional[Iterable[Tuple[int, int]]] = None) -> set:
+    """months 为 None 表示该条目依赖全部月份"""
+    if months is None:
+        return {(user_id, ALL_MONTHS)}
+    return {(user_id, m) for m in months}
+
+
+def invalidate_dates(user_id: int, dates: Iterable[Optional[date]]) -> int:
+    """交易写入提交后调用，失效涉及这些日期所在月份的缓存"""
+    tags = month_tags(user_id, {(d.year, d.month) for d in dates if d})
+    tags |= month_tags(user_id)
+    return stats_cache.invalidate_tags(tags)
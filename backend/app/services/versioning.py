@@ -0,0 +1,41 @@
+"""
+用户数据版本号与 ETag
+
+交易的每次写入都在同一事务中递增 users.data_version，
+只读接口据此生成 ETag，客户端带 If-None-Match 时可直接返回 304。
+"""
+import hashlib
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import User
+
+
+async def bump_data_version(db: AsyncSession, user_id: int) -> None:
+    """递增用户数据版本号（不提交事务）"""
+    await db.execute(
+        update(User).where(User.id == user_id).values(data_version=User.data_version + 1),
+        execution_options={"synchronize_session": False}
+    )
+
+
+async def get_data_version(db: AsyncSession, user_id: int) -> int:
+    version = await db.scalar(select(User.data_version).where(User.id == user_id))
+    return version or 0
+
+
+def make_etag(*parts) -> str:
+    """由版本号及请求参数生成弱校验 ETag"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """按弱比较规则判断 If-None-Match 是否命中"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
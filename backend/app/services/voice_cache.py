@@ -0,0 +1,88 @@
+"""
+语音记账 AI 解析结果缓存
+
+以归一化文本为键：去除空白和标点、统一全角半角与大小写，并把金额替换为占位符，
+因此“午餐25块”和“午餐 30 块”共用同一条缓存，命中后只需重新提取金额。
+"""
+import os
+import re
+import unicodedata
+from typing import Optional
+
+from .cache import TTLCache
+
+AMOUNT_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+AMOUNT_PLACEHOLDER = '#'
+
+voice_cache = TTLCache(
+    maxsize=int(os.getenv("VOICE_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("VOICE_CACHE_TTL", "86400"))
+)
+
+
+def _normalize_width(text: str) -> str:
+    # NFKC 会把全角数字、字母转换为半角
+    return unicodedata.normalize("NFKC", text)
+
+
+def normalize_voice_text(text: str) -> Optional[str]:
+    """生成缓存键；包含多个金额时无法确定对应关系，返回 None 表示不缓存"""
+    normalized = re.sub(r'[\W_]+', '', _normalize_width(text).lower())
+    if not normalized or len(AMOUNT_PATTERN.findall(normalized)) > 1:
+        return None
+    return AMOUNT_PATTERN.sub(AMOUNT_PLACEHOLDER, normalized)
+
+
+def extract_amount(text: str) -> Optional[float]:
+    match = AMOUNT_PATTERN.search(_normalize_width(text))
+    return float(match.group()) if match else None
+
+
+def get_cached_parse(text: str) -> Optional[dict]:
+    """命中时返回 {type, amount, category, description}，金额从当前文本中重新提取"""
+    key = normalize_voice_text(text)
+    if key is None:
+        return None
+
+    entry = voice_cache.get(key)
+    if entry is None:
+        return None
+
+    amount = extract_amount(text) or 0.0
+    description = entry["description"]
+    if description and entry["amount_text"]:
+        description = description.replace(entry["amount_text"], _format_amount(amount))
+
+    return {
+        "type": entry["type"],
+        "amount": amount,
+        "category": entry["category"],
+        "description": description
+    }
+
+
+def _format_amount(amount: float) -> str:
+    return f"{amount:g}"
+
+
+def store_parse(text: str, result: dict) -> None:
+    """缓存 AI 解析结果；AI 给出的金额与文本中的数字不一致时（如需要计算）不缓存"""
+    key = normalize_voice_text(text)
+    if key is None:
+        return
+
+    text_amount = extract_amount(text)
+    try:
+        result_amount = float(result.get("amount") or 0)
+    except (TypeError, ValueError):
+        return
+    if (text_amount or 0.0) != result_amount:
+        return
+
+    voice_cache.set(key, {
+        "type": result.get("type"),
+        "category": result.get("category"),
+        "description": result.get("description"),
+        # 描述中包含金额时，命中后替换为新的金额
+        "amount_text": _format_amount(text_amount) if text_amount is not None else None
+    })
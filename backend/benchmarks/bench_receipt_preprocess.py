@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+小票图片预处理基准：对比原图与预处理后的上传体积和耗时
+运行: python benchmarks/bench_receipt_preprocess.py [--image receipt.jpg] [--uplink-mbps 5] [--api]
+
+不指定 --image 时生成一张 4032x3024 的模拟手机照片（带 EXIF 旋转标记）。
+指定 --api 时使用当前 AI_API_KEY / AI_API_BASE 实际调用视觉模型，对比端到端耗时；
+否则按 --uplink-mbps 估算上传耗时。
+"""
+import sys
+import io
+import argparse
+import asyncio
+import base64
+import random
+import time
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.path.insert(0, '.')
+
+from PIL import Image, ImageDraw
+
+from app.services.image_preprocess import preprocess_image, preprocess_receipt_image, shutdown_pool
+
+
+def synthetic_photo(width=4032, height=3024, seed=7) -> bytes:
+    """模拟在桌面上拍摄的小票：带噪点的背景 + 白色小票 + 文字行"""
+    rng = random.Random(seed)
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    background = Image.blend(Image.new('RGB', (width, height), (120, 100, 80)), noise, 0.35)
+
+    draw = ImageDraw.Draw(background)
+    left, top = width // 3, height // 8
+    right, bottom = width * 2 // 3, height * 7 // 8
+    draw.rectangle((left, top, right, bottom), fill=(245, 245, 240))
+    y = top + 80
+    while y < bottom - 80:
+        line_width = rng.randint((right - left) // 3, right - left - 160)
+        draw.rectangle((left + 80, y, left + 80 + line_width, y + 28), fill=(30, 30, 30))
+        y += 70
+
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: 需要顺时针旋转 90°
+    exif[0x010F] = 'Benchmark Phone'
+    output = io.BytesIO()
+    background.save(output, 'JPEG', quality=95, exif=exif)
+    return output.getvalue()
+
+
+def describe(label, data: bytes, uplink_mbps: float):
+    payload = len(base64.b64encode(data))
+    upload = payload * 8 / (uplink_mbps * 1_000_000)
+    with Image.open(io.BytesIO(data)) as img:
+        size = img.size
+        has_exif = bool(img.getexif())
+    print(f"{label:<12} {size[0]}x{size[1]:<6} file {len(data) / 1024:8.1f} KB  "
+          f"base64 {payload / 1024:8.1f} KB  est. upload {upload:6.2f} s  exif={has_exif}")
+
+
+async def end_to_end(label, data: bytes, mime: str):
+    from app.routers.ai import ai_vision_parse_receipt
+
+    start = time.perf_counter()
+    result = await ai_vision_parse_receipt(base64.b64encode(data).decode(), mime)
+    print(f"{label:<12} end-to-end {time.perf_counter() - start:6.2f} s  result={result}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image', help='使用真实图片')
+    parser.add_argument('--uplink-mbps', type=float, default=5.0, help='估算上传耗时的上行带宽')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--api', action='store_true', help='实际调用视觉模型对比端到端耗时')
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            original = f.read()
+    else:
+        original = synthetic_photo()
+
+    processed, mime = preprocess_image(original)
+    describe('original', original, args.uplink_mbps)
+    describe('processed', processed, args.uplink_mbps)
+
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        preprocess_image(original)
+    inline = (time.perf_counter() - start) / args.runs
+
+    # 预热进程池，排除子进程启动耗时
+    await preprocess_receipt_image(original, 'image/jpeg')
+    start = time.perf_counter()
+    await asyncio.gather(*(preprocess_receipt_image(original, 'image/jpeg') for _ in range(args.runs)))
+    pooled = time.perf_counter() - start
+    print(f"\npreprocess  {inline * 1000:.0f} ms/image inline, "
+          f"{args.runs} images in {pooled * 1000:.0f} ms via process pool")
+
+    if args.api:
+        print()
+        await end_to_end('original', original, 'image/jpeg')
+        await end_to_end('processed', processed, mime)
+
+    shutdown_pool()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
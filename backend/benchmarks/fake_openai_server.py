@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+本地的 OpenAI 兼容假服务，用于演练熔断、重试和超时
+运行: python benchmarks/fake_openai_server.py [--port 8001] [--latency 0.2] [--fail-rate 0] [--status 503]
+然后以 AI_API_KEY=test AI_API_BASE=http://127.0.0.1:8001/v1 启动后端。
+
+运行时切换故障模式（无需重启）：
+    curl -X POST http://127.0.0.1:8001/_mode -d '{"fail_rate": 1, "status": 503}'
+    curl -X POST http://127.0.0.1:8001/_mode -d '{"fail_rate": 0, "latency": 0.1}'
+    curl http://127.0.0.1:8001/_stats
+"""
+import sys
+import io
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+MODE = {
+    "latency": 0.2,      # 每次响应前等待的秒数
+    "fail_rate": 0.0,    # 返回错误的概率
+    "status": 503,       # 错误时的状态码
+    "retry_after": None  # 错误响应中的 Retry-After 秒数
+}
+STATS = {"requests": 0, "failures": 0}
+_lock = threading.Lock()
+
+VOICE_REPLY = '{"type": "expense", "amount": 25, "category": "餐饮", "description": "午餐"}'
+VISION_REPLY = '{"amount": 48.40, "merchant": "测试商家", "category": "购物", "date": ""}'
+CHAT_REPLY = "这是本地假服务的回复 🐷"
+
+
+def pick_reply(body: dict) -> str:
+    content = body.get("messages", [{}])[-1].get("content")
+    if isinstance(content, list):
+        return VISION_REPLY
+    if content and "JSON" in content:
+        return VOICE_REPLY
+    return CHAT_REPLY
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, status: int, data: dict, headers: dict = None):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            with _lock:
+                self._send_json(200, {**STATS, "mode": MODE})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/_mode":
+            with _lock:
+                MODE.update({k: v for k, v in body.items() if k in MODE})
+                self._send_json(200, MODE)
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        with _lock:
+            STATS["requests"] += 1
+            mode = dict(MODE)
+            failed = random.random() < mode["fail_rate"]
+            if failed:
+                STATS["failures"] += 1
+        time.sleep(mode["latency"])
+
+        if failed:
+            headers = {"Retry-After": str(mode["retry_after"])} if mode["retry_after"] is not None else None
+            self._send_json(mode["status"], {"error": {"message": "injected failure"}}, headers)
+            return
+
+        reply = pick_reply(body)
+        if body.get("stream"):
+            self._send_stream(reply)
+        else:
+            self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": reply}}]})
+
+    def _send_stream(self, reply: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for ch in reply:
+            chunk = json.dumps({"choices": [{"delta": {"content": ch}}]}, ensure_ascii=False)
+            self._write_chunk(f"data: {chunk}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地假服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=MODE["latency"])
+    parser.add_argument("--fail-rate", type=float, default=MODE["fail_rate"])
+    parser.add_argument("--status", type=int, default=MODE["status"])
+    parser.add_argument("--retry-after", type=float, default=None)
+    args = parser.parse_args()
+
+    MODE.update(latency=args.latency, fail_rate=args.fail_rate, status=args.status, retry_after=args.retry_after)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Fake OpenAI server on http://{args.host}:{args.port}/v1  mode={MODE}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+数据库并发负载测试：同步 Session（阻塞事件循环） vs AsyncSession
+运行: python benchmarks/load_test_db.py [--concurrency 20] [--duration 5] [--work 300000]
+使用与后端相同的 DATABASE_URL / DATABASE_PATH 配置。
+
+两个接口都是 async def，执行同一条耗时查询（SQLite 为递归 CTE 计数，
+PostgreSQL 为 pg_sleep），区别只在于使用同步会话还是异步会话。
+压测期间另有一个协程每 10ms 唤醒一次并记录延迟，即事件循环被阻塞的时长，
+也就是慢查询期间其他请求（如 AI 接口）需要额外等待的时间。
+SQLite 的查询消耗 CPU，单核机器上两者吞吐量接近，主要差别在事件循环延迟；
+PostgreSQL 的查询等待网络和服务端，异步会话可同时执行 pool_size + max_overflow 条。
+"""
+import sys
+import io
+import argparse
+import asyncio
+import statistics
+import time
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.path.insert(0, '.')
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from app.database import SessionLocal, AsyncSessionLocal, engine, async_engine
+
+SQLITE_WORK = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) "
+    "SELECT count(*) FROM c"
+)
+POSTGRES_WORK = text("SELECT pg_sleep(:seconds)")
+
+
+def slow_query(work: int, sleep: float):
+    if engine.dialect.name == "postgresql":
+        return POSTGRES_WORK.bindparams(seconds=sleep)
+    return SQLITE_WORK.bindparams(n=work)
+
+
+def build_app(work: int, sleep: float) -> FastAPI:
+    app = FastAPI()
+    stmt = slow_query(work, sleep)
+
+    @app.get("/sync")
+    async def sync_route():
+        # 改造前的写法：async def 中直接调用同步会话
+        db = SessionLocal()
+        try:
+            return {"value": db.execute(stmt).scalar()}
+        finally:
+            db.close()
+
+    @app.get("/async")
+    async def async_route():
+        async with AsyncSessionLocal() as db:
+            return {"value": (await db.execute(stmt)).scalar()}
+
+    return app
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(client: httpx.AsyncClient, path: str, concurrency: int, duration: float) -> dict:
+    latencies = []
+    loop_lags = []
+    stop_at = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    async def monitor():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            loop_lags.append(time.perf_counter() - started - 0.01)
+
+    started = time.perf_counter()
+    await asyncio.gather(monitor(), *(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "lag_p50": statistics.median(loop_lags) * 1000 if loop_lags else 0.0,
+        "lag_max": max(loop_lags, default=0.0) * 1000
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=20, help='并发请求数')
+    parser.add_argument('--duration', type=float, default=5, help='每组压测秒数')
+    parser.add_argument('--work', type=int, default=300000, help='SQLite 递归 CTE 的行数')
+    parser.add_argument('--sleep', type=float, default=0.05, help='PostgreSQL pg_sleep 秒数')
+    args = parser.parse_args()
+
+    app = build_app(args.work, args.sleep)
+    transport = httpx.ASGITransport(app=app)
+    print(f"database: {engine.url.render_as_string()}  async: {async_engine.url.drivername}")
+    print(f"concurrency={args.concurrency} duration={args.duration}s")
+    print(f"{'mode':<8}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'lag p50':>10}{'lag max':>10}")
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # 预热连接池
+        await client.get("/sync")
+        await client.get("/async")
+        for mode in ("sync", "async"):
+            r = await run(client, f"/{mode}", args.concurrency, args.duration)
+            print(
+                f"{mode:<8}{r['requests']:>10}{r['rps']:>10.1f}{r['p50']:>10.1f}{r['p95']:>10.1f}"
+                f"{r['lag_p50']:>10.1f}{r['lag_max']:>10.1f}"
+            )
+
+    await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
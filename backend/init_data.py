@@ -12,7 +12,8 @@ from datetime import date, timedelta
 import random
 
 from app.database import SessionLocal, engine, Base
-from app.models import User, Transaction, TransactionType, TransactionSource
+from app.models import User, Category, Transaction, DailyRollup, TransactionType, TransactionSource
+from app.services import rebuild_rollup
 
 # 创建表
 Base.metadata.create_all(bind=engine)
@@ -57,6 +58,7 @@ def init_data():
 
     try:
         # 清空现有数据
+        db.query(DailyRollup).delete()
         db.query(Transaction).delete()
         db.query(User).delete()
         db.commit()
@@ -72,6 +74,20 @@ def init_data():
 
         print(f"[OK] Created user: {user.nickname}")
 
+        # 示例数据用到的分类不存在时创建
+        category_ids = {}
+        for category_type, category_list in (
+            (TransactionType.expense, expense_categories),
+            (TransactionType.income, income_categories),
+        ):
+            for category, _ in category_list:
+                row = db.query(Category).filter(Category.name == category).first()
+                if not row:
+                    row = Category(name=category, type=category_type)
+                    db.add(row)
+                    db.flush()
+                category_ids[category] = row.id
+
         # 生成最近30天的交易数据
         today = date.today()
         transactions = []
@@ -90,7 +106,7 @@ def init_data():
                     user_id=user.id,
                     type=TransactionType.expense,
                     amount=round(amount, 2),
-                    category=category,
+                    category_id=category_ids[category],
                     description=random.choice(desc_list),
                     date=current_date,
                     source=random.choice([TransactionSource.manual, TransactionSource.voice])
@@ -106,7 +122,7 @@ def init_data():
                     user_id=user.id,
                     type=TransactionType.income,
                     amount=round(amount, 2),
-                    category=category,
+                    category_id=category_ids[category],
                     description=random.choice(desc_list),
                     date=current_date,
                     source=TransactionSource.manual
@@ -114,6 +130,10 @@ def init_data():
 
         # 批量插入
         db.add_all(transactions)
+        db.flush()
+
+        # 重建按日汇总表
+        rebuild_rollup(db, user.id)
         db.commit()
 
         print(f"[OK] Generated {len(transactions)} transactions")
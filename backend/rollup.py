@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+按日汇总表 daily_rollup 维护脚本
+运行: python rollup.py rebuild [--user-id 1]   从交易表全量重建（回填）
+      python rollup.py check [--user-id 1]     校验汇总与交易是否一致
+"""
+import sys
+import io
+import argparse
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.path.insert(0, '.')
+
+from app.database import SessionLocal, engine, Base
+from app.services import rebuild_rollup, check_rollup
+
+# 创建表
+Base.metadata.create_all(bind=engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="daily_rollup 汇总表维护")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            rows = rebuild_rollup(db, args.user_id)
+            db.commit()
+            print(f"[OK] Rebuilt daily_rollup: {rows} rows")
+            return
+
+        mismatches = check_rollup(db, args.user_id)
+        for m in mismatches:
+            print(f"[MISMATCH] {m}")
+        print(f"[DONE] {len(mismatches)} mismatches")
+        if mismatches:
+            sys.exit(1)
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
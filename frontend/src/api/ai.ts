@@ -129,6 +129,44 @@ export const chatWithAI = (query: string, history?: { role: string; content: str
   return api.post<any, ChatResponse>('/ai/chat', { query, history })
 }
 
+// AI 对话（SSE 流式），每收到一段回复调用 onDelta，返回是否由 AI 生成
+export const chatWithAIStream = async (
+  query: string,
+  history: { role: string; content: string }[] | undefined,
+  onDelta: (delta: string) => void
+): Promise<boolean> => {
+  const response = await fetch(`${api.defaults.baseURL}/ai/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ query, history })
+  })
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed: ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let aiPowered = false
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // SSE 事件以空行分隔
+    const events = buffer.split('\n\n')
+    buffer = events.pop() || ''
+    for (const event of events) {
+      if (!event.startsWith('data:')) continue
+      const data = JSON.parse(event.slice(5).trim())
+      if (data.delta) onDelta(data.delta)
+      if (data.done) aiPowered = !!data.ai_powered
+    }
+  }
+  return aiPowered
+}
+
 // 获取 AI 配置状态
 export const getAIConfig = () => {
   return api.get<any, AIConfig>('/ai/config')
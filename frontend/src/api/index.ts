@@ -15,28 +15,12 @@ const api = axios.create({
   baseURL: getBaseURL(),
   timeout: 10000,
   headers: {
-    'Content-Type': 'application/json',
-    'Cache-Control': 'no-cache, no-store, must-revalidate',
-    'Pragma': 'no-cache'
+    'Content-Type': 'application/json'
   }
 })
 
-// 请求拦截器
-api.interceptors.request.use(
-  (config) => {
-    // 为 GET 请求添加时间戳防止缓存
-    if (config.method === 'get') {
-      config.params = {
-        ...config.params,
-        _t: Date.now()
-      }
-    }
-    return config
-  },
-  (error) => {
-    return Promise.reject(error)
-  }
-)
+// 不再添加时间戳参数：后端对列表和统计接口返回 ETag + Cache-Control: no-cache，
+// 浏览器/WebView 每次都会带 If-None-Match 重新验证，数据未变时只返回 304
 
 // 响应拦截器
 api.interceptors.response.use(
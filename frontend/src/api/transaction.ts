@@ -13,6 +13,7 @@ export interface Transaction {
 
 export interface TransactionQuery {
   skip?: number
+  cursor?: string
   limit?: number
   type?: 'income' | 'expense'
   start_date?: string